@@ -13,42 +13,155 @@
 # limitations under the License.
 
 #Version 8.1
-from core import auth
-from core import samlapp
-from aws import assumerolesaml
+# Only light standard library modules are imported here. core and aws pull in
+# requests, boto3 and colorama, so each function imports what it needs; this
+# keeps the credential_process cache-hit path free of them.
 import logging
-from config import readconfig
-from core import uprest
 import re
 import sys
 import argparse
+import json
+import os
+import time
+from contextlib import redirect_stdout
 from config import environment
 import traceback
 
-def get_environment(args):
-    tenant = args.tenant
+def get_tenant_url(tenant):
+    scheme = "https://"
+    if ("://" in tenant):
+        scheme, tenant = tenant.split("://", 1)
+        scheme = scheme + "://"
     if ("." not in tenant):
         tenant = tenant + ".idaptive.app"
     name = tenant.split(".")[0]
-    tenant = "https://" + tenant
+    return name, scheme + tenant
+
+def get_environment(args, tenant=None):
+    name, tenant = get_tenant_url(tenant or args.tenant)
     #cert = "cacerts_" + name + ".pem"  
     cert = True    # comment this line and uncomment above line to add certificate pinning. Please refer url https://identity-developer.cyberark.com/docs/making-cacertspem
     debug = args.debug
-    env = environment.Environment(name, tenant, cert, debug)
+    env = environment.Environment(name, tenant, cert, debug, args.polltimeout)
     return env
     
 
 
-def login_instance(proxy, environment):
-    user = input('Please enter your username : ')
+def login_instance(proxy, environment, use_cache=True, user=None):
+    if not user:
+        user = input('Please enter your username : ')
+    from core import auth
     version = "1.0"
-    session = auth.interactive_login(user, version, proxy, environment)
+    session = auth.cached_login(user, version, proxy, environment, use_cache)
     return session, user
 
-def set_logging():
-    logging.basicConfig(handlers=[logging.FileHandler('aws-cli.log', 'w', 'utf-8')], level=logging.INFO, format='%(asctime)s %(filename)s %(funcName)s %(lineno)d %(message)s')
+def set_logging(logfile='aws-cli.log', max_message=None):
+    from core import logpipeline
+    logpipeline.setup(logfile, max_message=logpipeline.MAX_MESSAGE if max_message is None else max_message)
     logging.info('Starting App..')
-    print("Logfile - aws-cli.log")
+    print("Logfile - " + logfile)
+
+def get_proxy():
+    from config import readconfig
+    from core import proxyroute
+    try:
+        proxy_obj = readconfig.read_config()
+    except IOError as e:
+        # Without the file the HTTP(S)_PROXY and NO_PROXY environment
+        # variables still apply
+        logging.info("%s", e)
+        proxy_obj = None
+    except:
+        logging.info("proxy.properties could not be read. Please make sure the file is beside the script or in the home directory.")
+        print("proxy.properties could not be read. Please make sure the file is beside the script or in the home directory.")
+        sys.exit()
+    return proxyroute.from_config(proxy_obj)
+
+def get_warm_urls(args, environments):
+    from urllib import parse as urlparse
+    from core import podcache
+    podcache.configure(args.podcachettl)
+    urls = []
+    for environment in environments:
+        tenant = environment.get_endpoint()
+        urls.append(tenant)
+        pod = podcache.load(tenant)
+        if pod is not None:
+            urls.append(urlparse.urlsplit(tenant).scheme + "://" + pod)
+    if args.stsbackend == 'builtin':
+        from aws import stsclient
+        if args.stsendpoint:
+            urls.append(args.stsendpoint)
+        else:
+            urls.append(stsclient.get_endpoint(args.region, args.stsglobal))
+    return urls
+
+def start_warmup(args, proxy, environments):
+    if (args.nowarmup or args.nokeepalive):
+        return None
+    # Connects to the tenants, pods and STS in the background while the
+    # user is typing; the warmer also sets up the shared transport.
+    from core import warmup
+    return warmup.start(lambda: get_warm_urls(args, environments), args.poolsize, True, proxy, environments[0].get_certpath())
+
+def prepare_transport(args, warmer):
+    # core pulls in requests; importing it only once the username is in lets
+    # the prompt show up without waiting for it.
+    from core import transport, samlcache, podcache
+    if warmer is not None:
+        warmer.wait_ready()
+    else:
+        transport.configure(pool_size=args.poolsize, keep_alive=not args.nokeepalive)
+    samlcache.enable_persistence(args.samlcache)
+    podcache.configure(args.podcachettl)
+
+def start_session(args, warm=True):
+    proxy = get_proxy()
+    environment = get_environment(args)
+    warmer = start_warmup(args, proxy, [environment]) if warm else None
+    user = args.user or input('Please enter your username : ')
+    prepare_transport(args, warmer)
+    session, user = login_instance(proxy, environment, not args.nosessioncache, user)
+    return proxy, environment, session, user
+
+def get_logins(args):
+    # (tenant, user, app selectors) for each login of this run, from
+    # -tenantsfile or from comma separated -tenant and -user
+    if args.tenantsfile:
+        from config import readconfig
+        return [(tenant, user or args.user, apps or args.app) for tenant, user, apps in readconfig.read_tenants(args.tenantsfile)]
+    tenants = [tenant.strip() for tenant in args.tenant.split(',') if tenant.strip()]
+    users = [user.strip() for user in (args.user or '').split(',') if user.strip()]
+    if (len(users) <= 1):
+        users = users * len(tenants) or [None] * len(tenants)
+    return [(tenant, user, args.app) for tenant, user in zip(tenants, users)]
+
+def get_login_label(environment, user, environments):
+    # The short tenant name, or the host when two tenants share it, plus the
+    # user when the same tenant is logged in to twice
+    names = [other.get_name() for other in environments]
+    if (names.count(environment.get_name()) == 1):
+        return environment.get_name()
+    host = environment.get_endpoint().split("://", 1)[-1]
+    hosts = [other.get_endpoint().split("://", 1)[-1] for other in environments]
+    if (hosts.count(host) == 1):
+        return host
+    return host + "/" + user
+
+def start_sessions(args, logins):
+    # Logs in to every tenant at once, so the run waits for the slowest MFA
+    # instead of the sum of them
+    proxy = get_proxy()
+    environments = [get_environment(args, tenant) for tenant, user, selectors in logins]
+    warmer = start_warmup(args, proxy, environments)
+    users = []
+    for (tenant, user, selectors), environment in zip(logins, environments):
+        users.append(user or input('Please enter your username for ' + environment.get_name() + ' : '))
+    prepare_transport(args, warmer)
+    from core import asyncengine
+    labelled = [(get_login_label(environment, user, environments), user, environment) for environment, user in zip(environments, users)]
+    sessions = asyncengine.login_tenants(labelled, proxy, not args.nosessioncache)
+    return proxy, [(label, environment, session, user, selectors) for (label, user, environment), session, (tenant, _, selectors) in zip(labelled, sessions, logins)]
     
 
 def select_app(awsapps):
@@ -61,63 +174,292 @@ def select_app(awsapps):
         return "1"
     return input("Enter Number : ")
 
-             
+
+def assume_all_roles(encoded_saml, display_name, region, duration, role_filter, workers, origin=None, selectors=None):
+    from core import samlapp, rolecatalog
+    from aws import batchassume
+    roles = samlapp.get_roles(encoded_saml)
+    if selectors:
+        entries, missing = rolecatalog.get_catalog(encoded_saml).select(selectors)
+        if missing:
+            print("No role matches " + ", ".join(missing) + " for " + display_name)
+        roles = [(entry.arn, entry.provider) for entry in entries]
+    roles = batchassume.filter_roles(roles, role_filter)
+    if (len(roles) == 0):
+        print("No roles match the filter for " + display_name)
+        return
+    expiry = samlapp.get_saml_expiry(encoded_saml)
+    print("Assuming " + str(len(roles)) + " roles for " + display_name + "..")
+    results = batchassume.assume_roles(roles, encoded_saml, display_name, region, duration, expiry, workers, origin)
+    batchassume.print_summary(results)
+
+
+def use_app(args, session, environment, proxy, app, count):
+    from core import samlapp, rolecatalog
+    from aws import assumerolesaml
+    appkey = app['AppKey']
+    display_name = app['DisplayName']
+    region = args.region
+    duration = args.duration
+    print("Calling app with key : " + appkey)
+    origin = (environment.get_endpoint(), appkey, session.username)
+    if args.allroles or args.role:
+        # -role picks roles by ARN, name or pattern without the menu
+        selectors = rolecatalog.split_selectors(args.role) if args.role else None
+        encoded_saml = samlapp.call_app(session, appkey, "1.0", environment, proxy)
+        assume_all_roles(encoded_saml, display_name, region, duration, args.rolefilter, args.workers, origin, selectors)
+        return count
+    while(True):
+        encoded_saml = samlapp.call_app(session, appkey, "1.0", environment, proxy)
+        _quit, awsinputs = samlapp.choose_role(encoded_saml, appkey)
+        if (_quit == 'q'):
+            break;
+        # The assertion is served from the cache until NotOnOrAfter; if it
+        # lapsed while the role was being picked, a fresh one is fetched
+        # here instead of sending a doomed call to STS.
+        saml = samlapp.call_app(session, appkey, "1.0", environment, proxy)
+        if (len(awsinputs) > 1):
+            assume_all_roles(saml, display_name, region, duration, None, args.workers, origin, [inputs.role for inputs in awsinputs])
+        else:
+            assumed = assumerolesaml.assume_role_with_saml(awsinputs[0].role, awsinputs[0].provider, saml, count, display_name, region, duration, origin)
+            if (assumed):
+                count = count + 1
+        if (_quit == 'one_role_quit'):
+            break
+    return count
+
+
+# credential_process mode. AWS SDKs run this on every client creation, so a
+# cache hit has a latency budget of 50 ms on top of interpreter start, and
+# must not import boto3, requests or colorama or touch the network.
+# benchmarks/bench_credential_process.py enforces both.
+def credential_process(args):
+    from aws import credcache
+    name, tenant = get_tenant_url(args.tenant)
+    output = credcache.load(tenant, args.appkey, args.role)
+    if output is None:
+        # stdout is reserved for the JSON document; everything the login
+        # flow prints, prompts included, goes to stderr instead.
+        with redirect_stdout(sys.stderr):
+            try:
+                output = fetch_process_credentials(args)
+            except SystemExit:
+                output = None
+            except Exception:
+                logging.exception("credential_process failed")
+                traceback.print_exc()
+                output = None
+    if output is None:
+        sys.stderr.write("Could not obtain credentials for " + args.role + "\n")
+        return 1
+    sys.stdout.write(json.dumps(output) + "\n")
+    sys.stdout.flush()
+    return 0
+
+def fetch_process_credentials(args):
+    from core import samlapp, util
+    from aws import assumerolesaml, credcache
+    set_logging(os.path.join(util.get_cache_dir(), 'credential-process.log'), args.logmaxmessage)
+    # No warm-up: credential_process runs unattended and should open only
+    # the connections it uses
+    proxy, environment, session, user = start_session(args, warm=False)
+    if session is None:
+        return None
+    encoded_saml = samlapp.call_app(session, args.appkey, "1.0", environment, proxy)
+    providers = dict(samlapp.get_roles(encoded_saml))
+    if args.role not in providers:
+        print("Role " + args.role + " is not available in app " + args.appkey)
+        return None
+    assumerolesaml.configure_sts(args.stsbackend, args.stsendpoint, proxy, args.region, not args.stsglobal)
+    cred = assumerolesaml.get_credentials(args.role, providers[args.role], encoded_saml, args.duration)
+    return credcache.save(environment.get_endpoint(), args.appkey, args.role, cred)
+
+def refresh_daemon(args):
+    from core import util, transport, samlcache
+    from aws import assumerolesaml, credstore, profileregistry, refreshdaemon
+    set_logging(os.path.join(util.get_cache_dir(), 'refresh-daemon.log'), args.logmaxmessage)
+    credstore.enable(args.credstore)
+    count = len(profileregistry.load_all())
+    if (count == 0):
+        print("No profiles to refresh yet. Create them with a normal run first.")
+        return 1
+    proxy = get_proxy()
+    transport.configure(pool_size=args.poolsize, keep_alive=not args.nokeepalive)
+    samlcache.enable_persistence(args.samlcache)
+    assumerolesaml.configure_sts(args.stsbackend, args.stsendpoint, proxy, args.region, not args.stsglobal)
+    daemon = refreshdaemon.RefreshDaemon(lambda tenant: get_environment(args, tenant), proxy, args.renewbefore)
+    print("Refreshing " + str(count) + " profile(s) ahead of expiry. Status : " + refreshdaemon.get_status_file())
+    print("Press Ctrl+C to stop.")
+    try:
+        daemon.run()
+    except KeyboardInterrupt:
+        print("Stopping..")
+    return 0
+
+def credstore_command(args):
+    from core import util
+    from aws import credstore
+    if not credstore.exists():
+        print("No credential store yet. Create it with a run using -credstore.")
+        return 1
+    if args.status:
+        status = credstore.get_status()
+        util.printline()
+        for profile, role, tenant, left, issued, saml_expires in status:
+            expiry = ("expires in " + str(int(left // 60)) + " min") if left > 0 else "expired"
+            saml = (", SAML assertion until " + time.ctime(saml_expires)) if saml_expires else ""
+            print(profile + " : " + role + " on " + tenant + ", " + expiry + ", issued " + time.ctime(issued) + saml)
+        util.printline()
+        print(str(len(status)) + " profile(s) in " + credstore.get_store_file())
+    if args.export:
+        exported, cred_file = credstore.export()
+        print("Exported " + str(len(exported)) + " unexpired profile(s) to " + cred_file)
+    return 0
+
 def client_main():
     parser = argparse.ArgumentParser(prog="AWSCLI", description="Enter your Identity Provider Credentials and choose AWS Role to create AWS Profile. Use this AWS Profile to run AWS commands.")
 
-    parser.add_argument("-tenant", "-t", help="Enter tenant url or name e.g. cloud.idaptive.com or cloud", default="cloud")
+    parser.add_argument("-tenant", "-t", help="Enter tenant url or name e.g. cloud.idaptive.com or cloud. Several tenants, separated by commas, are logged in to concurrently", default="cloud")
+    parser.add_argument("-tenantsfile", help="File with one [section] per login (tenant=, user=, app=) to log in to several tenants concurrently, instead of -tenant")
     parser.add_argument("-region", "-r", help="Enter AWS region. Default is us-west-2", default="us-west-2")
     parser.add_argument("-duration", help="Session duration in seconds for AssumeRoleWithSAML. Default is 3600, max is 43200.", type=int, default=3600)
     parser.add_argument("-debug", "-d", help="This will make debug on", action="store_true")
+    parser.add_argument("-allroles", help="Assume every role of the selected app (or every role matching -rolefilter) without prompting. Each profile is named <account>_<path>_<role>_profile", action="store_true")
+    parser.add_argument("-rolefilter", help="Regular expression selecting the role ARNs to assume with -allroles")
+    parser.add_argument("-workers", help="Number of roles assumed in parallel with -allroles. Default is 8", type=int, default=8)
+    parser.add_argument("-nosessioncache", help="Always authenticate from scratch instead of reusing a cached Idaptive session", action="store_true")
+    parser.add_argument("-app", help="AWS app to use, by AppKey, display name or a display name pattern such as 'Prod*'. Skips the app menu. Can be given more than once", action="append")
+    parser.add_argument("-nopipeline", help="With -app, fetch the app list and click the apps one after another instead of concurrently", action="store_true")
+    parser.add_argument("-appcachettl", help="Seconds to reuse the cached AWS app list before fetching it again, 0 disables the cache. Default 3600", type=int, default=3600)
+    parser.add_argument("-refreshapps", help="Fetch the AWS app list from the tenant even if a cached copy is still fresh", action="store_true")
+    parser.add_argument("-podcachettl", help="Seconds to remember which pod serves the tenant and log in there directly, 0 always asks the tenant URL first. Default 604800 (7 days)", type=int, default=604800)
+    parser.add_argument("-samlcache", help="Also keep SAML assertions on disk (private to the user) so re-runs within their validity window skip the app click", action="store_true")
+    parser.add_argument("-polltimeout", help="Seconds to wait for an out of band (push, email, SMS link) authentication to complete. Default is 300", type=int, default=300)
+    parser.add_argument("-poolsize", help="Number of pooled keep-alive connections per endpoint. Default is 4", type=int, default=4)
+    parser.add_argument("-nokeepalive", help="Close the connection after every REST call instead of reusing it", action="store_true")
+    parser.add_argument("-nowarmup", help="Do not open connections to the tenant, pod and STS in the background while prompting", action="store_true")
+    parser.add_argument("-stsbackend", help="Client used for AssumeRoleWithSAML: builtin (default, plain HTTPS call) or boto3", choices=['builtin', 'boto3'], default='builtin')
+    parser.add_argument("-stsendpoint", help="STS endpoint URL to call instead of the regional endpoint for -region")
+    parser.add_argument("-stsglobal", help="Call the global STS endpoint (sts.amazonaws.com) instead of the one for -region. Ignored for China (cn-) regions, which have no global endpoint", action="store_true")
+    parser.add_argument("-user", "-u", help="Username to log in with. Prompted for when not given. With several tenants, one username for all or one per tenant, separated by commas")
+    parser.add_argument("-credentialprocess", help="Print credentials for -appkey and -role as AWS credential_process JSON, from cache when still valid", action="store_true")
+    parser.add_argument("-appkey", help="App key of the AWS app, used with -credentialprocess")
+    parser.add_argument("-role", help="Roles to assume without the menu: ARNs, role names, account or path scoped names and patterns such as 'Admin*', '123456789012/ReadOnly', 'prod-*/Admin*' or 're:<regex>', separated by commas. With -credentialprocess, the role ARN")
+    parser.add_argument("-timings", help="Print how long each phase of the run took (HTTP calls, MFA polling, STS, credentials write) on exit", action="store_true")
+    parser.add_argument("-trace", help="Write the per-phase timings of this run to the given file as JSON")
+    parser.add_argument("-logmaxmessage", help="Longest log message in characters before it is truncated, 0 keeps full payloads (secrets are still redacted). Default 4096", type=int, default=4096)
+    parser.add_argument("-daemon", help="Keep running and refresh every profile written by this tool before it expires, reusing the cached session", action="store_true")
+    parser.add_argument("-renewbefore", help="With -daemon, seconds before expiry at which a profile is refreshed (plus jitter). Default 600", type=int, default=600)
+    parser.add_argument("-credstore", help="Also record every issued credential, its expiry and the SAML assertion expiry in a local SQLite store shared by concurrent runs and -daemon", action="store_true")
+    parser.add_argument("-status", help="List the profiles in the credential store with their expiry and exit", action="store_true")
+    parser.add_argument("-export", help="Write the unexpired profiles of the credential store to the AWS credentials file and exit", action="store_true")
     parser.add_argument("-version", "-v", action='version', version='Idaptive AWS CLI V1')
     args = parser.parse_args()
 
     if not (0 <= args.duration):
         parser.error("-duration must be greater than 0 seconds (got {}).".format(args.duration))
-
-    set_logging()
-    
-    try:
-        proxy_obj = readconfig.read_config()
-    except:
-        logging.info("proxy.properties file not found. Please make sure the files are at home dir of the script.")
-        print("proxy.properties file not found. Please make sure the files are at home dir of the script.")
-        sys.exit()
-    proxy = {}
-    if proxy_obj.is_proxy() == 'yes':
-        proxy={ 'http':proxy_obj.get_http(), 'https':proxy_obj.get_https(), 'username':proxy_obj.get_user(), 'password':proxy_obj.get_password() }
-    environment = get_environment(args)
-    session, user = login_instance(proxy, environment)
-    
-    region = args.region
-    duration = args.duration
-    
-    response = uprest.get_applications(user, session, environment, proxy)
-    result = response["Result"]
-    logging.info("Result " + str(result))
-    apps = result["Apps"]
-    logging.info("Apps : " + str(apps))
-    length = len(apps)
-    awsapps = []
-    for j in range (0, length):
+    if (args.workers < 1):
+        parser.error("-workers must be at least 1 (got {}).".format(args.workers))
+    if args.rolefilter:
         try:
-            appinfo = {}
-            if (("AWS" in apps[j]["TemplateName"] or "Amazon" in apps[j]["TemplateName"]) and apps[j]["WebAppType"] != 'UsernamePassword'):
-                appinfo = apps[j]
-                logging.info(appinfo)
-                awsapps.append(appinfo)
-        except KeyError:
+            re.compile(args.rolefilter)
+        except re.error as e:
+            parser.error("-rolefilter is not a valid regular expression ({}).".format(e))
+    if args.role:
+        for selector in args.role.split(','):
+            if selector.strip().lower().startswith('re:'):
+                try:
+                    re.compile(selector.strip()[3:])
+                except re.error as e:
+                    parser.error("-role {} is not a valid regular expression ({}).".format(selector.strip(), e))
+    if (args.polltimeout < 1):
+        parser.error("-polltimeout must be at least 1 second (got {}).".format(args.polltimeout))
+    if (args.appcachettl < 0):
+        parser.error("-appcachettl must not be negative (got {}).".format(args.appcachettl))
+    if (args.logmaxmessage < 0):
+        parser.error("-logmaxmessage must not be negative (got {}).".format(args.logmaxmessage))
+    if (args.podcachettl < 0):
+        parser.error("-podcachettl must not be negative (got {}).".format(args.podcachettl))
+    if (args.poolsize < 1):
+        parser.error("-poolsize must be at least 1 (got {}).".format(args.poolsize))
+    if (args.renewbefore < 60):
+        parser.error("-renewbefore must be at least 60 seconds (got {}).".format(args.renewbefore))
+    if (args.status or args.export):
+        return credstore_command(args)
+    if args.daemon:
+        return refresh_daemon(args)
+    if args.credentialprocess:
+        if not (args.appkey and args.role):
+            parser.error("-credentialprocess needs -appkey and -role.")
+        if (args.tenantsfile or ',' in args.tenant):
+            parser.error("-credentialprocess works with a single -tenant.")
+        return credential_process(args)
+    try:
+        logins = get_logins(args)
+    except Exception as e:
+        parser.error("Could not read -tenantsfile ({}).".format(e))
+    if (len(logins) == 0):
+        parser.error("No tenant to log in to.")
+    users = [user.strip() for user in (args.user or '').split(',') if user.strip()]
+    if (not args.tenantsfile and len(users) > 1 and len(users) != len(logins)):
+        parser.error("-user needs one username, or one per tenant (got {} for {} tenants).".format(len(users), len(logins)))
+
+    set_logging(max_message=args.logmaxmessage)
+    if args.credstore:
+        from aws import credstore
+        credstore.enable()
+    if args.timings or args.trace:
+        from core import timings
+        timings.configure(args.timings, args.trace)
+    if (len(logins) == 1):
+        tenant, user, selectors = logins[0]
+        args.tenant, args.user = tenant, user
+        proxy, environment, session, user = start_session(args)
+        return use_tenant(args, proxy, environment, session, user, selectors or [])
+    proxy, sessions = start_sessions(args, logins)
+    status = 0
+    for label, environment, session, user, selectors in sessions:
+        print()
+        print("===== " + label + " : " + user + " =====")
+        if session is None:
+            print("Login to " + label + " failed, see the log for details")
+            status = 1
             continue
+        status = use_tenant(args, proxy, environment, session, user, selectors or []) or status
+    return status
 
-    logging.info("AWSapps : " + str(awsapps))
+def use_tenant(args, proxy, environment, session, user, selectors):
+    from core import appcatalog
+    from aws import assumerolesaml
+    assumerolesaml.configure_sts(args.stsbackend, args.stsendpoint, proxy, args.region, not args.stsglobal)
+    
+    if selectors:
+        if args.nopipeline:
+            catalog, awsapps, missing = appcatalog.select_apps(selectors, user, session, environment, proxy, args.appcachettl, args.refreshapps)
+        else:
+            # Fetches the app list and clicks every selected app concurrently;
+            # the SAML assertions land in the SAML cache for use_app below
+            from core import asyncengine
+            catalog, awsapps, missing = asyncengine.prepare_apps(selectors, user, session, environment, proxy, args.appcachettl, args.refreshapps, args.workers)
+        if missing:
+            print("No AWS application matches " + ", ".join(missing) + " for the user " + user)
+            return 1
+    else:
+        catalog = appcatalog.get_catalog(user, session, environment, proxy, args.appcachettl, args.refreshapps)
+        awsapps = catalog.apps
     
     if (len(awsapps) == 0):
         print("No AWS Applications to select for the user " + user)
         return
     
-    pattern = re.compile("[^0-9.]")
-    count = 1
+    if selectors:
+        for app in awsapps:
+            use_app(args, session, environment, proxy, app, 0)
+        logging.info("Done")
+        return
+    
     profilecount = [0] * len(awsapps)
+    pattern = re.compile("[^0-9.]")
     while(True):
         number = select_app(awsapps)
         if (number == ""):
@@ -128,29 +470,34 @@ def client_main():
         if (int(number) - 1 >= len(awsapps)):
             continue
         
-        appkey = awsapps[int(number)-1]['AppKey']
-        display_name = awsapps[int(number)-1]['DisplayName']
-        print("Calling app with key : " + appkey)
-        encoded_saml = samlapp.call_app(session, appkey, "1.0", environment, proxy)
-        while(True):
-            _quit, awsinputs = samlapp.choose_role(encoded_saml, appkey)
-            if (_quit == 'q'):
-                break;
-            count = profilecount [int(number)-1]
-            assumed = assumerolesaml.assume_role_with_saml(awsinputs.role, awsinputs.provider, awsinputs.saml, count, display_name, region, duration)
-            if (assumed):
-                profilecount [int(number)-1] = count + 1
-            if (_quit == 'one_role_quit'):
-                break
-
+        profilecount[int(number)-1] = use_app(args, session, environment, proxy, awsapps[int(number)-1], profilecount[int(number)-1])
         if (len(awsapps) == 1):
             break
 
     logging.info("Done")
+
+def shutdown():
+    if 'core.warmup' in sys.modules:
+        from core import warmup
+        warmup.report()
+    if 'core.timings' in sys.modules:
+        from core import timings
+        timings.finish()
+    if 'core.transport' in sys.modules:
+        from core import transport
+        transport.get_transport().log_stats()
+        transport.get_transport().close()
+    if 'aws.credstore' in sys.modules:
+        from aws import credstore
+        credstore.close()
+    if 'core.logpipeline' in sys.modules:
+        from core import logpipeline
+        logpipeline.stop()
     logging.shutdown()
 
+exit_status = 0
 try:    
-    client_main()
+    exit_status = client_main()
 except SystemExit as se:
     print("Program Exited..")
     exc_type, exc_value, exc_traceback = sys.exc_info()
@@ -160,5 +507,6 @@ except:
     exc_type, exc_value, exc_traceback = sys.exc_info()
     traceback.print_exception(exc_type, exc_value, exc_traceback)
 finally:
-    logging.shutdown()
-
+    shutdown()
+if exit_status:
+    sys.exit(exit_status)
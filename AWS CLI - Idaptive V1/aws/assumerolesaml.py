@@ -12,32 +12,46 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import boto3
-from botocore.exceptions import ClientError
-from os.path import expanduser
-import configparser
 import sys
 import logging
+import threading
+import time
+from aws.credwriter import CredentialWriter
+from aws import credcache, credstore, profileregistry
+from core import timings
 
-def write_cred(cred, count, display_name, region, role):
-    home = expanduser("~")
-    print('home = ' + home)
-    cred_file = home + "/.aws/credentials"
-    config = configparser.RawConfigParser()
-    config.read(cred_file)
-    print("Display Name : " + display_name)
+def get_profile_name(role):
     rolesplit = role.split('/')
-    profile_name = rolesplit[1] + '_profile'
-    section = profile_name 
-    if not config.has_section(section):
-        config.add_section(section)
-    config.set(section, 'output', 'json')
-    config.set(section, 'region', region)
-    config.set(section, 'aws_access_key_id', cred['Credentials']['AccessKeyId'])
-    config.set(section, 'aws_secret_access_key', cred['Credentials']['SecretAccessKey'])
-    config.set(section, 'aws_session_token', cred['Credentials']['SessionToken'])
-    with open(cred_file, 'w+') as credentials:
-        config.write(credentials)
+    return rolesplit[1] + '_profile'
+
+def get_batch_profile_name(role):
+    # Batches usually hold the same role name in several accounts, and path
+    # roles share their first path part, so the account and the whole path
+    # go into the name: 111111111111_prod_Admin_profile
+    account = role.split(':')[4]
+    return '_'.join([account] + role.split('/')[1:]) + '_profile'
+
+def write_cred(cred, count, display_name, region, role, verbose=True, writer=None, section=None):
+    if verbose:
+        print("Display Name : " + display_name)
+    if section is None:
+        section = get_profile_name(role)
+    values = {}
+    values['output'] = 'json'
+    values['region'] = region
+    values['aws_access_key_id'] = cred['Credentials']['AccessKeyId']
+    values['aws_secret_access_key'] = cred['Credentials']['SecretAccessKey']
+    values['aws_session_token'] = cred['Credentials']['SessionToken']
+    if writer is None:
+        writer = CredentialWriter()
+        writer.add(section, values)
+        writer.commit()
+        if verbose:
+            print('Credentials file = ' + writer.cred_file)
+    else:
+        writer.add(section, values)
+    if not verbose:
+        return section
     print('\n\n')
     print('-' * 80)
     print('Your profile is created. It will expire at ' + str(cred['Credentials']['Expiration']))
@@ -45,17 +59,134 @@ def write_cred(cred, count, display_name, region, role):
     print('Example - ')
     print('aws s3 ls --profile ' + section)
     print('-' * 80)
+    return section
+
+BACKENDS = ('builtin', 'boto3')
+
+# Regional endpoints that fail this way are retried against the global one
+FALLBACK_CODES = ('RequestError', 'RegionDisabledException')
+
+sts_backend = 'builtin'
+sts_endpoint = None
+sts_proxy = {}
+sts_region = None
+sts_regional = True
+sts_clients = {}
+sts_lock = threading.Lock()
+
+def configure_sts(backend='builtin', endpoint=None, proxy=None, region=None, regional=True):
+    global sts_backend, sts_endpoint, sts_proxy, sts_region, sts_regional
+    if backend not in BACKENDS:
+        raise ValueError("Unknown STS backend " + str(backend))
+    sts_backend = backend
+    sts_endpoint = endpoint
+    sts_proxy = proxy or {}
+    sts_region = region
+    sts_regional = regional
+
+def get_sts_endpoint(use_global=False):
+    from aws import stsclient
+    if sts_endpoint:
+        return sts_endpoint
+    return stsclient.get_endpoint(sts_region, use_global or not sts_regional)
+
+def new_sts_client(endpoint):
+    if (sts_backend == 'builtin'):
+        from aws import stsclient
+        return stsclient.BuiltinStsClient(endpoint, sts_proxy)
+    # boto3 takes a few hundred milliseconds to import; load it only once an
+    # STS call is actually about to be made.
+    import boto3
+    from botocore.config import Config
+    from core import proxyroute
+    proxies = dict((scheme, url) for scheme, url in (proxyroute.get_proxies(sts_proxy, endpoint) or {}).items() if url)
+    return boto3.client('sts', region_name=sts_region or 'us-east-1', endpoint_url=endpoint, config=Config(proxies=proxies))
+
+def get_sts_client(use_global=False):
+    endpoint = get_sts_endpoint(use_global)
+    key = (sts_backend, sts_region, endpoint)
+    with sts_lock:
+        client = sts_clients.get(key)
+        if client is None:
+            logging.info("STS endpoint for region " + str(sts_region) + " resolved to " + endpoint + " (" + sts_backend + ")")
+            client = new_sts_client(endpoint)
+            sts_clients[key] = client
+    return client
+
+def get_client_endpoint(stsclient):
+    if hasattr(stsclient, 'endpoint'):
+        return stsclient.endpoint
+    return stsclient.meta.endpoint_url
+
+def get_sts_errors():
+    from aws.stsclient import StsError
+    if (sts_backend == 'boto3'):
+        from botocore.exceptions import ClientError
+        return (StsError, ClientError)
+    return (StsError,)
+
+def is_fallback_error(error):
+    if get_error_code(error) in FALLBACK_CODES:
+        return True
+    if (sts_backend == 'boto3'):
+        from botocore.exceptions import ConnectionError
+        return isinstance(error, ConnectionError)
+    return False
+
+def get_error_status(error):
+    status = getattr(error, 'status', None)
+    if status is None:
+        status = getattr(error, 'response', {}).get('ResponseMetadata', {}).get('HTTPStatusCode')
+    return status
+
+def call_sts(stsclient, role, principle, saml, duration):
+    endpoint = get_client_endpoint(stsclient)
+    start = time.monotonic()
+    try:
+        with timings.span('sts_assume_role', role=role, endpoint=endpoint) as span:
+            try:
+                cred = stsclient.assume_role_with_saml(RoleArn=role, PrincipalArn=principle, SAMLAssertion=saml, DurationSeconds=duration)
+            except Exception as e:
+                span.status = get_error_status(e) or span.status
+                raise
+            if span.status is None:
+                span.status = cred.get('ResponseMetadata', {}).get('HTTPStatusCode')
+            return cred
+    finally:
+        logging.info("STS AssumeRoleWithSAML for " + role + " via " + endpoint + " took " + str(int((time.monotonic() - start) * 1000)) + " ms")
+
+def get_credentials(role, principle, saml, duration=3600, stsclient=None):
+    if stsclient is None:
+        stsclient = get_sts_client()
+    try:
+        return call_sts(stsclient, role, principle, saml, duration)
+    except Exception as e:
+        from aws.stsclient import has_global_endpoint
+        if sts_endpoint or not has_global_endpoint(sts_region):
+            raise
+        global_client = get_sts_client(use_global=True)
+        if global_client is stsclient or not is_fallback_error(e):
+            raise
+        logging.info("STS call via " + get_client_endpoint(stsclient) + " failed (" + str(e) + "), falling back to " + get_client_endpoint(global_client))
+        return call_sts(global_client, role, principle, saml, duration)
 
-    
+def get_error_code(error):
+    response = getattr(error, 'response', None)
+    if isinstance(response, dict):
+        return response.get('Error', {}).get('Code', '')
+    return ''
 
-def assume_role_with_saml(role, principle, saml, count, display_name, region, duration=3600):
-    stsclient = boto3.client('sts')
+def assume_role_with_saml(role, principle, saml, count, display_name, region, duration=3600, origin=None):
     try:
-        cred = stsclient.assume_role_with_saml(RoleArn=role, PrincipalArn=principle, SAMLAssertion=saml, DurationSeconds=duration)
-    except ClientError as e:
+        cred = get_credentials(role, principle, saml, duration)
+    except get_sts_errors() as e:
         print("Access Denied. Please check.. " + str(e))
         logging.info(str(e))
         return False
-    write_cred(cred, count, display_name, region, role)
+    profile = write_cred(cred, count, display_name, region, role)
+    if origin is not None:
+        credcache.save(origin[0], origin[1], role, cred)
+        entry = profileregistry.new_entry(profile, origin, role, principle, display_name, region, duration, cred)
+        profileregistry.record([entry])
+        credstore.record_issued([(entry, cred)], saml)
     return True
-    
\ No newline at end of file
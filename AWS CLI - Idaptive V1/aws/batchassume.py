@@ -0,0 +1,138 @@
+# Copyright 2019 CyberArk, LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import logging
+import random
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from aws import assumerolesaml
+from aws.credwriter import CredentialWriter
+from aws import credcache, credstore, profileregistry
+from core.util import printline
+from core import timings
+
+DEFAULT_WORKERS = 8
+THROTTLE_CODES = ('Throttling', 'ThrottlingException', 'RequestLimitExceeded', 'TooManyRequestsException')
+# Keep a small margin so no call is started with an assertion about to lapse
+EXPIRY_MARGIN = 5
+
+
+class RoleResult(object):
+    '''
+    Outcome of assuming one role in batch mode
+    '''
+    def __init__(self, role, provider):
+        self.role = role
+        self.provider = provider
+        self.cred = None
+        self.error = None
+        self.attempts = 0
+        self.profile = None
+
+
+def filter_roles(roles, role_filter):
+    if not role_filter:
+        return list(roles)
+    pattern = re.compile(role_filter)
+    return [(role, provider) for role, provider in roles if pattern.search(role)]
+
+
+def seconds_left(expiry):
+    if expiry is None:
+        return None
+    return (expiry - datetime.now(timezone.utc)).total_seconds() - EXPIRY_MARGIN
+
+
+def assume_one(result, saml, duration, expiry, stsclient, max_attempts=6):
+    sts_errors = assumerolesaml.get_sts_errors()
+    delay = 0.5
+    while True:
+        left = seconds_left(expiry)
+        if left is not None and left <= 0:
+            result.error = "SAML assertion expired before the role could be assumed"
+            return result
+        result.attempts = result.attempts + 1
+        try:
+            result.cred = assumerolesaml.get_credentials(result.role, result.provider, saml, duration, stsclient)
+            return result
+        except sts_errors as e:
+            code = assumerolesaml.get_error_code(e)
+            if code not in THROTTLE_CODES or result.attempts >= max_attempts:
+                result.error = str(e)
+                return result
+            sleep = random.uniform(0, delay)
+            if left is not None:
+                sleep = min(sleep, max(left, 0))
+            logging.info("Throttled assuming " + result.role + ", retrying in " + str(round(sleep, 2)) + "s")
+            time.sleep(sleep)
+            delay = min(delay * 2, 8)
+        except Exception as e:
+            logging.exception("Error assuming " + result.role)
+            result.error = str(e)
+            return result
+
+
+def assume_roles(roles, saml, display_name, region, duration=3600, expiry=None, workers=DEFAULT_WORKERS, origin=None):
+    results = [RoleResult(role, provider) for role, provider in roles]
+    if not results:
+        return results
+    stsclient = assumerolesaml.get_sts_client()
+    workers = max(1, min(workers, len(results)))
+    logging.info("Assuming " + str(len(results)) + " roles on " + str(workers) + " workers")
+    with timings.span('batch_assume', roles=len(results), workers=workers), ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(assume_one, result, saml, duration, expiry, stsclient) for result in results]
+        for future in futures:
+            future.result()
+    writer = CredentialWriter()
+    profiles = {}
+    for result in results:
+        if result.cred is None:
+            continue
+        profile = assumerolesaml.get_batch_profile_name(result.role)
+        if profile in profiles:
+            # Never let one role silently overwrite another's profile
+            result.error = "Profile " + profile + " is already used by " + profiles[profile]
+            result.cred = None
+            continue
+        profiles[profile] = result.role
+        result.profile = assumerolesaml.write_cred(result.cred, 0, display_name, region, result.role, verbose=False, writer=writer, section=profile)
+    writer.commit()
+    if origin is not None:
+        entries = []
+        issued = []
+        for result in results:
+            if result.cred is not None:
+                credcache.save(origin[0], origin[1], result.role, result.cred)
+                entry = profileregistry.new_entry(result.profile, origin, result.role, result.provider, display_name, region, duration, result.cred)
+                entries.append(entry)
+                issued.append((entry, result.cred))
+        profileregistry.record(entries)
+        credstore.record_issued(issued, saml)
+    return results
+
+
+def print_summary(results):
+    printline()
+    # Sorting by ARN groups the roles by account
+    succeeded = sorted((result for result in results if result.cred is not None), key=lambda result: result.role)
+    failed = sorted((result for result in results if result.cred is None), key=lambda result: result.role)
+    for result in succeeded:
+        print("OK     " + result.role + " -> --profile " + result.profile + " (expires " + str(result.cred['Credentials']['Expiration']) + ")")
+    for result in failed:
+        print("FAILED " + result.role + " : " + str(result.error))
+    printline()
+    print(str(len(succeeded)) + " of " + str(len(results)) + " roles assumed.")
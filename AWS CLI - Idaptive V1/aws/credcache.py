@@ -0,0 +1,79 @@
+# Copyright 2019 CyberArk, LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+# Credentials issued by this tool, kept per tenant, app and role so that the
+# credential_process mode can answer without any network call. This module is
+# on the credential_process cache-hit path and must only import the standard
+# library (plus core.util) - no boto3, requests or colorama.
+
+import hashlib
+import json
+import os
+import time
+from core import util
+
+CACHE_DIR = 'credentials'
+# Credentials closer than this to their expiry are not handed out again
+MIN_TTL = 300
+
+
+def get_key(tenant, appkey, role):
+    raw = tenant.lower().rstrip('/') + '|' + appkey + '|' + role
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def get_cache_file(tenant, appkey, role):
+    directory = os.path.join(util.get_cache_dir(), CACHE_DIR)
+    if not os.path.isdir(directory):
+        os.makedirs(directory, 0o700)
+    return os.path.join(directory, get_key(tenant, appkey, role) + '.json')
+
+
+def to_process_output(cred):
+    from datetime import datetime, timezone
+    credentials = cred['Credentials']
+    expiration = credentials['Expiration']
+    if not isinstance(expiration, datetime):
+        expiration = datetime.strptime(str(expiration), '%Y-%m-%dT%H:%M:%SZ')
+    if expiration.tzinfo is None:
+        expiration = expiration.replace(tzinfo=timezone.utc)
+    output = {
+        'Version': 1,
+        'AccessKeyId': credentials['AccessKeyId'],
+        'SecretAccessKey': credentials['SecretAccessKey'],
+        'SessionToken': credentials['SessionToken'],
+        'Expiration': expiration.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+    }
+    return output, expiration.timestamp()
+
+
+def save(tenant, appkey, role, cred):
+    output, expires = to_process_output(cred)
+    entry = {'expires': expires, 'credentials': output}
+    util.write_private_file(get_cache_file(tenant, appkey, role), json.dumps(entry))
+    return output
+
+
+def load(tenant, appkey, role, min_ttl=MIN_TTL):
+    try:
+        with open(get_cache_file(tenant, appkey, role), 'r') as cache_file:
+            entry = json.load(cache_file)
+        expires = entry['expires']
+        output = entry['credentials']
+    except (IOError, ValueError, KeyError):
+        return None
+    if expires - min_ttl <= time.time():
+        return None
+    return output
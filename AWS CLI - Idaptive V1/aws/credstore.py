@@ -0,0 +1,247 @@
+# Copyright 2019 CyberArk, LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+
+# Optional SQLite record of every credential this tool issued: one row per
+# tenant, app and role with the keys, their expiry, the expiry of the SAML
+# assertion they came from and when they were issued. Lookups by profile
+# name and role ARN go through indexes; the database runs in WAL mode so the
+# CLI, credential_process and the refresh daemon can read and write it at
+# the same time. The AWS credentials file can be rebuilt from it on demand.
+
+import logging
+import os
+import threading
+import time
+from aws import credcache
+from core import util
+
+STORE_FILE = 'credentials.db'
+SCHEMA_VERSION = 1
+# Seconds a writer waits for another process's transaction to finish
+BUSY_TIMEOUT = 10
+COLUMNS = ('tenant', 'appkey', 'role', 'profile', 'user', 'provider', 'display_name', 'region', 'duration',
+           'access_key_id', 'secret_access_key', 'session_token', 'expires', 'saml_expires', 'issued')
+
+SCHEMA = (
+    '''CREATE TABLE IF NOT EXISTS credentials (
+        tenant TEXT NOT NULL,
+        appkey TEXT NOT NULL,
+        role TEXT NOT NULL,
+        profile TEXT NOT NULL,
+        user TEXT,
+        provider TEXT,
+        display_name TEXT,
+        region TEXT,
+        duration INTEGER,
+        access_key_id TEXT NOT NULL,
+        secret_access_key TEXT NOT NULL,
+        session_token TEXT NOT NULL,
+        expires REAL NOT NULL,
+        saml_expires REAL,
+        issued REAL NOT NULL,
+        PRIMARY KEY (tenant, appkey, role))''',
+    'CREATE INDEX IF NOT EXISTS credentials_profile ON credentials (profile, issued)',
+    'CREATE INDEX IF NOT EXISTS credentials_role ON credentials (role, issued)',
+    'CREATE INDEX IF NOT EXISTS credentials_expires ON credentials (expires)'
+)
+
+_enabled = False
+_connection = None
+_lock = threading.Lock()
+
+
+def enable(enabled=True):
+    global _enabled
+    _enabled = enabled
+
+def is_enabled():
+    return _enabled
+
+def get_store_file():
+    return os.path.join(util.get_cache_dir(), STORE_FILE)
+
+def exists():
+    return os.path.isfile(get_store_file())
+
+def connect(path=None):
+    import sqlite3
+    path = path or get_store_file()
+    if not os.path.exists(path):
+        # Created private before SQLite opens it; it holds secrets
+        os.close(os.open(path, os.O_RDWR | os.O_CREAT, 0o600))
+    connection = sqlite3.connect(path, timeout=BUSY_TIMEOUT, isolation_level=None, check_same_thread=False)
+    connection.row_factory = sqlite3.Row
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute('PRAGMA synchronous=NORMAL')
+    if connection.execute('PRAGMA user_version').fetchone()[0] < SCHEMA_VERSION:
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            for statement in SCHEMA:
+                connection.execute(statement)
+            connection.execute('PRAGMA user_version = ' + str(SCHEMA_VERSION))
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+    return connection
+
+def get_connection():
+    global _connection
+    if _connection is None:
+        _connection = connect()
+    return _connection
+
+def close():
+    global _connection
+    with _lock:
+        if _connection is not None:
+            _connection.close()
+            _connection = None
+
+def new_row(entry, cred, saml_expires=None):
+    # entry is a profileregistry entry; cred the AssumeRoleWithSAML response
+    output, expires = credcache.to_process_output(cred)
+    if saml_expires is not None and hasattr(saml_expires, 'timestamp'):
+        saml_expires = saml_expires.timestamp()
+    return {
+        'tenant': entry['tenant'].lower().rstrip('/'),
+        'appkey': entry['appkey'],
+        'role': entry['role'],
+        'profile': entry['profile'],
+        'user': entry['user'],
+        'provider': entry['provider'],
+        'display_name': entry['display_name'],
+        'region': entry['region'],
+        'duration': entry['duration'],
+        'access_key_id': output['AccessKeyId'],
+        'secret_access_key': output['SecretAccessKey'],
+        'session_token': output['SessionToken'],
+        'expires': expires,
+        'saml_expires': saml_expires,
+        'issued': time.time()
+    }
+
+def put(rows):
+    if not rows:
+        return 0
+    statement = 'INSERT OR REPLACE INTO credentials (' + ', '.join(COLUMNS) + ') VALUES (' + ', '.join('?' * len(COLUMNS)) + ')'
+    with _lock:
+        connection = get_connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            connection.executemany(statement, [tuple(row[column] for column in COLUMNS) for row in rows])
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+    logging.info("Stored %d credential(s) in %s", len(rows), get_store_file())
+    return len(rows)
+
+def record(rows):
+    # Called wherever credentials are issued; a no-op unless -credstore is on,
+    # and never fatal to the run that produced the credentials
+    if not _enabled or not rows:
+        return 0
+    try:
+        return put(rows)
+    except Exception as e:
+        logging.exception("Could not store credentials : %s", e)
+        return 0
+
+def record_issued(issued, saml=None):
+    # issued is [(profile registry entry, AssumeRoleWithSAML response)]; the
+    # SAML expiry is only parsed when the store is on
+    if not _enabled or not issued:
+        return 0
+    saml_expires = None
+    if saml is not None:
+        from core.samlassertion import get_saml_expiry
+        try:
+            saml_expires = get_saml_expiry(saml)
+        except Exception as e:
+            logging.info("Could not read the SAML expiry : %s", e)
+    return record([new_row(entry, cred, saml_expires) for entry, cred in issued])
+
+def query(sql, parameters=()):
+    with _lock:
+        return [dict(row) for row in get_connection().execute(sql, parameters).fetchall()]
+
+def get(tenant, appkey, role):
+    rows = query('SELECT * FROM credentials WHERE tenant = ? AND appkey = ? AND role = ?', (tenant.lower().rstrip('/'), appkey, role))
+    return rows[0] if rows else None
+
+def get_by_profile(profile):
+    rows = query('SELECT * FROM credentials WHERE profile = ? ORDER BY issued DESC LIMIT 1', (profile,))
+    return rows[0] if rows else None
+
+def get_by_role(role):
+    return query('SELECT * FROM credentials WHERE role = ? ORDER BY issued DESC', (role,))
+
+def get_all():
+    return query('SELECT * FROM credentials ORDER BY profile, issued DESC')
+
+def get_valid(min_ttl=0, now=None):
+    return query('SELECT * FROM credentials WHERE expires > ? ORDER BY profile, issued DESC', ((now or time.time()) + min_ttl,))
+
+def remove_expired(now=None):
+    with _lock:
+        cursor = get_connection().execute('DELETE FROM credentials WHERE expires <= ?', (now or time.time(),))
+        return cursor.rowcount
+
+def to_process_output(row):
+    return {
+        'Version': 1,
+        'AccessKeyId': row['access_key_id'],
+        'SecretAccessKey': row['secret_access_key'],
+        'SessionToken': row['session_token'],
+        'Expiration': util.format_epoch(row['expires'])
+    }
+
+def export(cred_file=None, profiles=None, min_ttl=0):
+    # Writes the newest valid credentials of each profile (or of the given
+    # profiles) to the AWS credentials file in one commit
+    from aws.credwriter import CredentialWriter
+    writer = CredentialWriter(cred_file)
+    wanted = set(profiles) if profiles else None
+    exported = []
+    seen = set()
+    for row in get_valid(min_ttl):
+        if row['profile'] in seen or (wanted is not None and row['profile'] not in wanted):
+            continue
+        seen.add(row['profile'])
+        writer.add(row['profile'], {
+            'output': 'json',
+            'region': row['region'],
+            'aws_access_key_id': row['access_key_id'],
+            'aws_secret_access_key': row['secret_access_key'],
+            'aws_session_token': row['session_token']
+        })
+        exported.append(row['profile'])
+    writer.commit()
+    return exported, writer.cred_file
+
+def get_status(now=None):
+    # [(profile, role, tenant, expires in seconds, issued, saml expiry)] with
+    # the newest row of each profile
+    now = now or time.time()
+    status = []
+    seen = set()
+    for row in get_all():
+        if row['profile'] in seen:
+            continue
+        seen.add(row['profile'])
+        status.append((row['profile'], row['role'], row['tenant'], row['expires'] - now, row['issued'], row['saml_expires']))
+    return status
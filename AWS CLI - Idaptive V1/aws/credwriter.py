@@ -0,0 +1,198 @@
+# Copyright 2019 CyberArk, LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import logging
+import os
+import re
+import tempfile
+from os.path import expanduser
+from core import timings
+
+if (os.name == 'nt'):
+    import msvcrt
+else:
+    import fcntl
+
+SECTION = re.compile(r'\[(?P<header>.+)\]\s*$')
+OPTION = re.compile(r'(?P<key>[^=:\s][^=:]*?)\s*[=:]')
+
+
+def get_credentials_file():
+    return os.path.join(expanduser("~"), ".aws", "credentials")
+
+
+class FileLock(object):
+    '''
+    Advisory lock held on a side file while the credentials file is rewritten
+    '''
+    def __init__(self, path):
+        self.path = path
+        self.handle = None
+
+    def __enter__(self):
+        self.handle = open(self.path, 'a+')
+        if (os.name == 'nt'):
+            self.handle.seek(0)
+            msvcrt.locking(self.handle.fileno(), msvcrt.LK_LOCK, 1)
+        else:
+            fcntl.flock(self.handle.fileno(), fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        try:
+            if (os.name == 'nt'):
+                self.handle.seek(0)
+                msvcrt.locking(self.handle.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(self.handle.fileno(), fcntl.LOCK_UN)
+        finally:
+            self.handle.close()
+            self.handle = None
+
+
+def split_sections(text):
+    preamble = []
+    sections = []
+    current = preamble
+    for line in text.splitlines(True):
+        match = SECTION.match(line) if not line[:1].isspace() else None
+        if match:
+            current = [line]
+            sections.append((match.group('header'), current))
+        else:
+            current.append(line)
+    return preamble, sections
+
+
+def get_continuation_end(lines, index):
+    # Index after the indented continuation lines of the option at index;
+    # blank lines only belong to the value if an indented line follows them
+    end = index + 1
+    for next_index in range(index + 1, len(lines)):
+        line = lines[next_index]
+        if line.strip() == '':
+            continue
+        if not line[:1].isspace():
+            break
+        end = next_index + 1
+    return end
+
+
+def update_section(lines, values, newline):
+    pending = dict((key.lower(), value) for key, value in values.items())
+    updated = lines[:1]
+    index = 1
+    while index < len(lines):
+        line = lines[index]
+        match = OPTION.match(line)
+        if match and not line[:1].isspace() and match.group('key').strip().lower() in pending:
+            key = match.group('key').strip().lower()
+            updated.append(key + " = " + pending.pop(key) + newline)
+            # The old value's continuation lines would otherwise be read
+            # back as part of the new value
+            index = get_continuation_end(lines, index)
+            continue
+        updated.append(line)
+        index = index + 1
+    lines = updated
+    if not pending:
+        return lines
+    end = len(lines)
+    while end > 1 and lines[end - 1].strip() == '':
+        end = end - 1
+    if not lines[end - 1].endswith(('\n', '\r')):
+        lines[end - 1] = lines[end - 1] + newline
+    added = [key + " = " + value + newline for key, value in values.items() if key.lower() in pending]
+    return lines[:end] + added + lines[end:]
+
+
+def new_section(section, values, newline):
+    return ["[" + section + "]" + newline] + [key + " = " + value + newline for key, value in values.items()] + [newline]
+
+
+class CredentialWriter(object):
+    '''
+    Collects profile updates for the AWS credentials file and commits them in
+    one atomic write, under an advisory lock. Sections that are not updated
+    are written back byte-for-byte
+    '''
+    def __init__(self, cred_file=None):
+        self.cred_file = cred_file or get_credentials_file()
+        self.updates = {}
+
+    def add(self, section, values):
+        self.updates.setdefault(section, {}).update(values)
+
+    def pending(self):
+        return len(self.updates)
+
+    def render(self, text):
+        newline = '\r\n' if '\r\n' in text else '\n'
+        preamble, sections = split_sections(text)
+        found = {}
+        for name, lines in sections:
+            found.setdefault(name, lines)
+        for section, values in self.updates.items():
+            if section in found:
+                lines = found[section]
+                lines[:] = update_section(lines, values, newline)
+            else:
+                if sections:
+                    last = sections[-1][1]
+                elif preamble:
+                    last = preamble
+                else:
+                    last = None
+                if last is not None and not last[-1].endswith(('\n', '\r')):
+                    last[-1] = last[-1] + newline
+                if last is not None and last[-1].strip() != '':
+                    last.append(newline)
+                lines = new_section(section, values, newline)
+                sections.append((section, lines))
+                found[section] = lines
+        return ''.join(preamble) + ''.join(''.join(lines) for name, lines in sections)
+
+    def commit(self):
+        if not self.updates:
+            return 0
+        directory = os.path.dirname(self.cred_file)
+        if not os.path.isdir(directory):
+            os.makedirs(directory, 0o700)
+        with timings.span('write_credentials', profiles=len(self.updates)) as span, FileLock(self.cred_file + '.lock'):
+            try:
+                with open(self.cred_file, 'r', newline='') as cred_file:
+                    text = cred_file.read()
+                mode = os.stat(self.cred_file).st_mode & 0o777
+            except FileNotFoundError:
+                text = ''
+                mode = 0o600
+            content = self.render(text)
+            span.bytes = len(content)
+            handle, temp_path = tempfile.mkstemp(prefix='.credentials.', dir=directory)
+            try:
+                with os.fdopen(handle, 'w', newline='') as temp_file:
+                    temp_file.write(content)
+                    temp_file.flush()
+                    os.fsync(temp_file.fileno())
+                os.chmod(temp_path, mode)
+                os.replace(temp_path, self.cred_file)
+            except BaseException:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                raise
+        count = len(self.updates)
+        logging.info("Wrote " + str(count) + " profile(s) to " + self.cred_file)
+        self.updates = {}
+        return count
@@ -0,0 +1,93 @@
+# Copyright 2019 CyberArk, LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+
+# Every profile this tool has written to the AWS credentials file, with where
+# it came from (tenant, user, app, role) and when its credentials expire.
+# The refresh daemon renews profiles from this list.
+
+import json
+import logging
+import os
+import threading
+import time
+from aws import credcache
+from aws.credwriter import FileLock
+from core import util
+
+REGISTRY_FILE = 'profiles.json'
+
+_lock = threading.Lock()
+
+
+def get_registry_file():
+    return os.path.join(util.get_cache_dir(), REGISTRY_FILE)
+
+
+def locked():
+    # The CLI and the refresh daemon update the registry from separate
+    # processes; the thread lock alone only covers this one
+    return FileLock(get_registry_file() + '.lock')
+
+
+def read_registry():
+    try:
+        with open(get_registry_file(), 'r') as registry_file:
+            return json.load(registry_file)
+    except (IOError, ValueError):
+        return {}
+
+
+def write_registry(entries):
+    util.write_private_file(get_registry_file(), json.dumps(entries, indent=1, sort_keys=True))
+
+
+def new_entry(profile, origin, role, provider, display_name, region, duration, cred):
+    tenant, appkey, user = origin
+    return {
+        'profile': profile,
+        'tenant': tenant,
+        'user': user,
+        'appkey': appkey,
+        'display_name': display_name,
+        'role': role,
+        'provider': provider,
+        'region': region,
+        'duration': duration,
+        'expires': credcache.to_process_output(cred)[1],
+        'written': time.time()
+    }
+
+
+def record(entries):
+    if not entries:
+        return
+    with _lock, locked():
+        registry = read_registry()
+        for entry in entries:
+            registry[entry['profile']] = entry
+        write_registry(registry)
+    logging.info("Registered %d profile(s) for refresh", len(entries))
+
+
+def load_all():
+    return read_registry()
+
+
+def remove(profile):
+    with _lock, locked():
+        registry = read_registry()
+        if registry.pop(profile, None) is not None:
+            write_registry(registry)
@@ -0,0 +1,224 @@
+# Copyright 2019 CyberArk, LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+
+# Keeps the profiles in the registry fresh. Each profile is renewed a little
+# ahead of its expiry, spread with jitter so that profiles written together do
+# not all renew in the same second. Renewals reuse the cached session and SAML
+# assertion; the user is only asked to log in (and pass MFA) again when the
+# cached session is gone or rejected.
+
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from aws import assumerolesaml, credcache, credstore, profileregistry
+from aws.credwriter import CredentialWriter
+from core import auth, samlapp, sessioncache, util
+
+STATUS_FILE = 'refresh-status.json'
+# Renew this long before expiry, minus up to JITTER_FRACTION of the
+# credential lifetime (capped at MAX_JITTER) picked at random per profile
+DEFAULT_RENEW_BEFORE = 600
+JITTER_FRACTION = 0.1
+MAX_JITTER = 300
+# Wait after a failed renewal, doubled for each further failure
+RETRY_DELAY = 30
+MAX_RETRY_DELAY = 600
+# Longest sleep, so that profiles added to the registry are picked up
+MAX_SLEEP = 60
+
+
+class ProfileState(object):
+    '''
+    Schedule of one registered profile
+    '''
+    def __init__(self, entry):
+        self.entry = entry
+        self.next_refresh = None
+        self.last_refresh = None
+        self.failures = 0
+        self.state = 'scheduled'
+        self.error = None
+
+    def get_group(self):
+        return (self.entry['tenant'], self.entry['user'], self.entry['appkey'])
+
+
+class RefreshDaemon(object):
+    '''
+    Renews registered profiles ahead of expiry until stopped
+    '''
+    def __init__(self, get_environment, proxy, renew_before=DEFAULT_RENEW_BEFORE, interactive=None, clock=time.time):
+        self.get_environment = get_environment
+        self.proxy = proxy
+        self.renew_before = renew_before
+        self.interactive = sys.stdin.isatty() if interactive is None else interactive
+        self.clock = clock
+        self.profiles = {}
+        self.stop_event = threading.Event()
+
+    def schedule(self, state):
+        entry = state.entry
+        lifetime = max(0, entry['expires'] - entry.get('written', entry['expires']))
+        jitter = random.uniform(0, min(MAX_JITTER, lifetime * JITTER_FRACTION))
+        state.next_refresh = max(self.clock(), entry['expires'] - self.renew_before - jitter)
+        state.failures = 0
+        state.state = 'scheduled'
+        state.error = None
+
+    def sync(self):
+        registry = profileregistry.load_all()
+        for profile in list(self.profiles):
+            if profile not in registry:
+                del self.profiles[profile]
+        for profile, entry in registry.items():
+            state = self.profiles.get(profile)
+            if state is None:
+                state = self.profiles[profile] = ProfileState(entry)
+                self.schedule(state)
+            elif entry['expires'] != state.entry['expires']:
+                # Written again outside the daemon, e.g. by an interactive run
+                state.entry = entry
+                self.schedule(state)
+
+    def get_due(self):
+        now = self.clock()
+        return [state for state in self.profiles.values() if state.next_refresh <= now]
+
+    def get_session(self, user, environment):
+        tenant = environment.get_endpoint()
+        session = sessioncache.load(tenant, user)
+        if session is not None:
+            if auth.validate_session(session, self.proxy, environment):
+                return session
+            sessioncache.remove(tenant, user)
+        if not self.interactive:
+            return None
+        print("The session for " + user + " on " + tenant + " has ended. Log in again to keep refreshing its profiles.")
+        return auth.cached_login(user, "1.0", self.proxy, environment, True)
+
+    def fail(self, state, error):
+        state.failures += 1
+        state.state = 'failed'
+        state.error = error
+        state.next_refresh = self.clock() + min(MAX_RETRY_DELAY, RETRY_DELAY * 2 ** (state.failures - 1))
+        logging.info("Refreshing %s failed (%s), retrying at %s", state.entry['profile'], error, time.ctime(state.next_refresh))
+
+    def refresh_group(self, group, states, writer):
+        tenant, user, appkey = group
+        environment = self.get_environment(tenant)
+        session = self.get_session(user, environment)
+        if session is None:
+            for state in states:
+                state.state = 'needs-login'
+                state.error = 'Session ended, run the tool interactively to log in again'
+                state.next_refresh = self.clock() + MAX_RETRY_DELAY
+            return []
+        # Elevation prompts for MFA; without a terminal it would hang the daemon
+        saml = samlapp.call_app(session, appkey, "1.0", environment, self.proxy, interactive=self.interactive)
+        if saml is None:
+            logging.info("App %s needs MFA elevation, skipping its %d profile(s)", appkey, len(states))
+            for state in states:
+                state.state = 'needs-login'
+                state.error = 'App needs MFA elevation, run the tool interactively to refresh it'
+                state.next_refresh = self.clock() + MAX_RETRY_DELAY
+            return []
+        renewed = []
+        issued = []
+        for state in states:
+            entry = state.entry
+            try:
+                cred = assumerolesaml.get_credentials(entry['role'], entry['provider'], saml, entry['duration'])
+            except assumerolesaml.get_sts_errors() as e:
+                self.fail(state, str(e))
+                continue
+            assumerolesaml.write_cred(cred, 0, entry['display_name'], entry['region'], entry['role'], verbose=False, writer=writer, section=entry['profile'])
+            credcache.save(tenant, appkey, entry['role'], cred)
+            renewed.append(profileregistry.new_entry(entry['profile'], (tenant, appkey, user), entry['role'], entry['provider'], entry['display_name'], entry['region'], entry['duration'], cred))
+            issued.append((renewed[-1], cred))
+        credstore.record_issued(issued, saml)
+        return renewed
+
+    def refresh(self, due):
+        groups = {}
+        for state in due:
+            state.state = 'refreshing'
+            groups.setdefault(state.get_group(), []).append(state)
+        writer = CredentialWriter()
+        renewed = []
+        for group, states in groups.items():
+            try:
+                renewed.extend(self.refresh_group(group, states, writer))
+            except (Exception, SystemExit) as e:
+                # The REST helpers exit on network errors; in the daemon that
+                # only means this group is retried later
+                logging.exception("Refreshing profiles of %s failed", group[2])
+                for state in states:
+                    if state.state == 'refreshing':
+                        self.fail(state, str(e) or type(e).__name__)
+        writer.commit()
+        profileregistry.record(renewed)
+        now = self.clock()
+        for entry in renewed:
+            state = self.profiles[entry['profile']]
+            state.entry = entry
+            state.last_refresh = now
+            self.schedule(state)
+            logging.info("Refreshed %s, expires %s, next refresh %s", entry['profile'], time.ctime(entry['expires']), time.ctime(state.next_refresh))
+        return renewed
+
+    def write_status(self):
+        profiles = {}
+        for profile, state in sorted(self.profiles.items()):
+            profiles[profile] = {
+                'role': state.entry['role'],
+                'app': state.entry['display_name'],
+                'expires': util.format_epoch(state.entry['expires']),
+                'next_refresh': util.format_epoch(state.next_refresh),
+                'last_refresh': util.format_epoch(state.last_refresh),
+                'state': state.state,
+                'error': state.error
+            }
+        status = {'pid': os.getpid(), 'updated': util.format_epoch(self.clock()), 'renew_before': self.renew_before, 'profiles': profiles}
+        util.write_private_file(get_status_file(), json.dumps(status, indent=1))
+
+    def run_once(self):
+        self.sync()
+        due = self.get_due()
+        renewed = self.refresh(due) if due else []
+        self.write_status()
+        return renewed
+
+    def get_sleep(self):
+        if not self.profiles:
+            return MAX_SLEEP
+        next_refresh = min(state.next_refresh for state in self.profiles.values())
+        return min(MAX_SLEEP, max(1, next_refresh - self.clock()))
+
+    def run(self):
+        while not self.stop_event.is_set():
+            self.run_once()
+            self.stop_event.wait(self.get_sleep())
+
+    def stop(self):
+        self.stop_event.set()
+
+
+def get_status_file():
+    return os.path.join(util.get_cache_dir(), STATUS_FILE)
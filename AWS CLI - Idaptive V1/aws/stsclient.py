@@ -0,0 +1,131 @@
+# Copyright 2019 CyberArk, LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import logging
+import xml.etree.ElementTree as ET
+from urllib import parse as urlparse
+from core import transport, timings
+from core import util
+
+GLOBAL_ENDPOINT = 'https://sts.amazonaws.com'
+API_VERSION = '2011-06-15'
+NAMESPACE = '{https://sts.amazonaws.com/doc/2011-06-15/}'
+DEFAULT_TIMEOUT = 30
+
+
+def resolve_endpoint(region):
+    if not region or region == 'aws-global':
+        return GLOBAL_ENDPOINT
+    if region.startswith('cn-'):
+        return 'https://sts.' + region + '.amazonaws.com.cn'
+    return 'https://sts.' + region + '.amazonaws.com'
+
+def has_global_endpoint(region):
+    # sts.amazonaws.com only serves the aws partition; the China regions
+    # (aws-cn) must always use their own endpoint
+    return not (region and region.startswith('cn-'))
+
+def get_endpoint(region, use_global=False):
+    if use_global and has_global_endpoint(region):
+        return GLOBAL_ENDPOINT
+    return resolve_endpoint(region)
+
+
+class StsError(Exception):
+    '''
+    Error returned by STS. Carries the same response['Error'] structure as
+    botocore's ClientError so callers can inspect either the same way
+    '''
+    def __init__(self, code, message, status=None):
+        super().__init__("An error occurred (" + code + ") when calling the AssumeRoleWithSAML operation: " + message)
+        self.code = code
+        self.status = status
+        self.response = {'Error': {'Code': code, 'Message': message}}
+
+
+def parse_error(text, status):
+    try:
+        root = ET.fromstring(text)
+    except ET.ParseError:
+        return StsError('HttpError' + str(status), text[:200], status)
+    code = message = None
+    for element in root.iter():
+        if element.tag.endswith('}Code') or element.tag == 'Code':
+            code = element.text
+        if element.tag.endswith('}Message') or element.tag == 'Message':
+            message = element.text
+    return StsError(code or 'HttpError' + str(status), message or '', status)
+
+
+def parse_response(text):
+    root = ET.fromstring(text)
+    result = root.find(NAMESPACE + 'AssumeRoleWithSAMLResult')
+    if result is None:
+        raise StsError('MalformedResponse', 'AssumeRoleWithSAMLResult missing from the STS response')
+    credentials = result.find(NAMESPACE + 'Credentials')
+    if credentials is None:
+        raise StsError('MalformedResponse', 'Credentials missing from the STS response')
+    cred = {}
+    cred['Credentials'] = {
+        'AccessKeyId': credentials.findtext(NAMESPACE + 'AccessKeyId'),
+        'SecretAccessKey': credentials.findtext(NAMESPACE + 'SecretAccessKey'),
+        'SessionToken': credentials.findtext(NAMESPACE + 'SessionToken'),
+        'Expiration': util.parse_iso_time(credentials.findtext(NAMESPACE + 'Expiration'))
+    }
+    assumed_user = result.find(NAMESPACE + 'AssumedRoleUser')
+    if assumed_user is not None:
+        cred['AssumedRoleUser'] = {
+            'AssumedRoleId': assumed_user.findtext(NAMESPACE + 'AssumedRoleId'),
+            'Arn': assumed_user.findtext(NAMESPACE + 'Arn')
+        }
+    for name in ('Subject', 'SubjectType', 'Issuer', 'Audience', 'NameQualifier', 'SourceIdentity'):
+        value = result.findtext(NAMESPACE + name)
+        if value is not None:
+            cred[name] = value
+    return cred
+
+
+class BuiltinStsClient(object):
+    '''
+    Minimal STS client for AssumeRoleWithSAML. The call is unsigned, so it is a
+    plain form POST over the pooled transport; no botocore involved
+    '''
+    def __init__(self, endpoint=GLOBAL_ENDPOINT, proxy=None, certpath=True, timeout=DEFAULT_TIMEOUT):
+        self.endpoint = endpoint.rstrip('/') + '/'
+        self.proxy = proxy or {}
+        self.certpath = certpath
+        self.timeout = timeout
+
+    def assume_role_with_saml(self, RoleArn, PrincipalArn, SAMLAssertion, DurationSeconds=3600):
+        body = urlparse.urlencode({
+            'Action': 'AssumeRoleWithSAML',
+            'Version': API_VERSION,
+            'RoleArn': RoleArn,
+            'PrincipalArn': PrincipalArn,
+            'SAMLAssertion': SAMLAssertion,
+            'DurationSeconds': str(DurationSeconds)
+        })
+        headers = {'Content-Type': 'application/x-www-form-urlencoded; charset=utf-8', 'Accept': 'text/xml'}
+        logging.info("Calling STS AssumeRoleWithSAML at " + self.endpoint + " for " + RoleArn)
+        with timings.span(timings.HTTP_SPAN, path='/AssumeRoleWithSAML') as span:
+            try:
+                response = transport.get_transport().post(self.endpoint, data=body, headers=headers, verify=self.certpath, proxies=self.proxy, timeout=self.timeout)
+            except Exception as e:
+                logging.exception("Error in calling " + self.endpoint)
+                raise StsError('RequestError', str(e))
+            span.set_response(response)
+        if (response.status_code != 200):
+            raise parse_error(response.text, response.status_code)
+        return parse_response(response.text)
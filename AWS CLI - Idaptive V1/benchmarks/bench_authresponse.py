@@ -0,0 +1,84 @@
+# Copyright 2019 CyberArk, LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+# Per-poll cost of decoding an AdvanceAuthentication response, comparing the
+# previous decode-per-getter AuthResponse against the parse-once model.
+#
+#   python benchmarks/bench_authresponse.py
+
+import json
+from common import FakeResponse, measure, report
+from core.authresponse import AuthResponse
+
+POLL_BODY = json.dumps({
+    'success': True,
+    'Result': {
+        'Summary': 'OobPending',
+        'GeneratedAuthValue': '42',
+        'TenantId': 'ABC1234',
+        'SessionId': 'c2d1b5a6-7f3e-4a0c-9d2b-6c1f0e8a7b3d'
+    },
+    'Message': None,
+    'MessageID': None,
+    'Exception': None,
+    'ErrorID': None,
+    'ErrorCode': None,
+    'IsSoftError': False,
+    'InnerExceptions': None
+})
+
+
+class LegacyAuthResponse(object):
+    '''
+    AuthResponse as it was before the parse-once model, kept for comparison
+    '''
+    def __init__(self, response, tenant_url):
+        self.response = response
+        self.tenant_url = tenant_url
+        json_resp = json.loads(self.response.text)
+
+    def get_success_result(self):
+        return json.loads(self.response.text)['success']
+
+    def get_summary(self):
+        return json.loads(self.response.text)['Result']['Summary']
+
+
+def legacy_poll(response):
+    resp = LegacyAuthResponse(response, 'https://tenant')
+    resp.get_success_result()
+    resp.get_summary()
+    json.loads(response.text).get('Result', {}).get('GeneratedAuthValue')
+
+
+def current_poll(response):
+    resp = AuthResponse(response, 'https://tenant')
+    resp.get_success_result()
+    resp.get_summary()
+    resp.get_generated_auth_value()
+
+
+def main():
+    response = FakeResponse(POLL_BODY)
+    results = [
+        measure('authresponse_poll_legacy', lambda: legacy_poll(response)),
+        measure('authresponse_poll', lambda: current_poll(response))
+    ]
+    report('authresponse', results)
+    return results
+
+
+if __name__ == '__main__':
+    main()
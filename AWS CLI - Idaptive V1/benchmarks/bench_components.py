@@ -0,0 +1,128 @@
+# Copyright 2019 CyberArk, LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+
+# Hot components of the login path, fed with the mock tenant's payloads:
+# AuthResponse parsing, SamlHtmlParser on the handleAppClick form,
+# choose_role on a fresh and on a repeated assertion, and write_cred into a
+# credentials file that already holds other profiles. Fails if replacing a
+# key leaves its old continuation lines behind.
+#
+#   python benchmarks/bench_components.py
+
+import builtins
+import configparser
+import contextlib
+import io
+import itertools
+import json
+import os
+import tempfile
+from datetime import datetime, timedelta, timezone
+from common import FakeResponse, measure, report
+from mocktenant import MockTenant, build_app_form, build_saml, get_roles
+from core.authresponse import AuthResponse
+from core.htmlparser import SamlHtmlParser
+from core import samlapp, samlassertion
+from aws import assumerolesaml
+from aws.credwriter import CredentialWriter
+
+ROLES = 50
+EXISTING_PROFILES = 50
+
+
+def challenge_body():
+    tenant = MockTenant(mechanisms=('Text', 'StartOob', 'StartTextOob'), redirect=False)
+    return json.dumps(tenant.start_authentication('localhost', {'User': 'user@example.com'}))
+
+
+def parse_html(html):
+    parser = SamlHtmlParser()
+    parser.feed(html)
+    saml = parser.get_saml()
+    parser.clean()
+    return saml
+
+
+def choose(encoded_saml):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return samlapp.choose_role(encoded_saml, 'aws-app-0000')
+
+
+def fresh_choose(roles):
+    # More distinct assertions than samlassertion memoizes, so every call
+    # parses, as after a new app click
+    assertions = itertools.cycle([build_saml(roles) for i in range(2 * samlassertion.MAX_PARSED)])
+    return lambda: choose(next(assertions))
+
+
+def prime_credentials(cred_file):
+    lines = []
+    for i in range(EXISTING_PROFILES):
+        lines.append('[existing' + str(i) + '_profile]\naws_access_key_id = AKIAEXISTING' + str(i) + '\naws_secret_access_key = secret\n')
+    with open(cred_file, 'w') as existing:
+        existing.write('\n'.join(lines))
+
+
+def write_profile(cred_file, cred, role):
+    writer = CredentialWriter(cred_file)
+    assumerolesaml.write_cred(cred, 0, 'AWS Mock 0', 'us-west-2', role, verbose=False, writer=writer)
+    writer.commit()
+
+
+def check_continuation(cred_file):
+    # A replaced key must not keep the old value's continuation lines, which
+    # configparser would read back as part of the new value
+    with open(cred_file, 'w') as existing:
+        existing.write('[check_profile]\naws_access_key_id=OLD\n  continued\n\n  more\nregion = us-east-1\n')
+    writer = CredentialWriter(cred_file)
+    writer.add('check_profile', {'aws_access_key_id': 'NEW'})
+    writer.commit()
+    parser = configparser.RawConfigParser()
+    parser.read(cred_file)
+    if dict(parser.items('check_profile')) != {'aws_access_key_id': 'NEW', 'region': 'us-east-1'}:
+        raise RuntimeError("Replacing a key kept its continuation lines : " + str(dict(parser.items('check_profile'))))
+
+
+def main():
+    poll = FakeResponse(json.dumps({'success': True, 'Result': {'Summary': 'OobPending', 'GeneratedAuthValue': '42'}}), headers={'Retry-After': '0.01'})
+    challenges = FakeResponse(challenge_body())
+    roles = get_roles(ROLES)
+    encoded_saml = build_saml(roles)
+    html = build_app_form(encoded_saml)
+    cred = {'Credentials': {'AccessKeyId': 'ASIAMOCK', 'SecretAccessKey': 'secret', 'SessionToken': 'token' * 80, 'Expiration': datetime.now(timezone.utc) + timedelta(hours=1)}}
+    original_input = builtins.input
+    builtins.input = lambda prompt='': '1'
+    try:
+        with tempfile.TemporaryDirectory() as work_dir:
+            check_continuation(os.path.join(work_dir, 'continuation'))
+            cred_file = os.path.join(work_dir, 'credentials')
+            prime_credentials(cred_file)
+            results = [
+                measure('authresponse_poll', lambda: AuthResponse(poll, 'https://tenant').get_summary()),
+                measure('authresponse_challenges', lambda: AuthResponse(challenges, 'https://tenant').get_challenges()),
+                measure('saml_html_parser_' + str(ROLES) + '_roles', lambda: parse_html(html), 1000),
+                measure('choose_role_fresh_' + str(ROLES) + '_roles', fresh_choose(roles), 200),
+                measure('choose_role_repeat_' + str(ROLES) + '_roles', lambda: choose(encoded_saml), 1000),
+                measure('write_cred_' + str(EXISTING_PROFILES) + '_profiles', lambda: write_profile(cred_file, cred, roles[0][0]), 200)
+            ]
+    finally:
+        builtins.input = original_input
+    report('components', results)
+    return results
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+# Copyright 2019 CyberArk, LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+
+
+# Credential store lookups against re-reading the AWS credentials file: with
+# a few hundred profiles, fetching one profile by name or role ARN from the
+# SQLite store versus parsing the INI file for it. Then several processes
+# record credentials into the same store at once, which must lose no rows.
+#
+#   python benchmarks/bench_credstore.py [profiles]
+
+import configparser
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from common import APP_DIR, measure, report
+from core import util
+
+PROFILES = 500
+WRITERS = 4
+WRITES = 50
+
+
+def new_row(i, tenant='https://bench.example.com'):
+    now = time.time()
+    return {
+        'tenant': tenant, 'appkey': 'app' + str(i % 5), 'role': 'arn:aws:iam::%012d:role/Role%d' % (100000000000 + i % 20, i),
+        'profile': 'Role' + str(i) + '_profile', 'user': 'user@example.com', 'provider': 'arn:aws:iam::100000000000:saml-provider/Idaptive',
+        'display_name': 'Bench', 'region': 'us-west-2', 'duration': 3600,
+        'access_key_id': 'ASIA' + str(i), 'secret_access_key': 'secret' + str(i), 'session_token': 'token' + str(i) * 40,
+        'expires': now + 3600, 'saml_expires': now + 300, 'issued': now
+    }
+
+
+def read_ini(cred_file, profile):
+    parser = configparser.RawConfigParser()
+    parser.read(cred_file)
+    return dict(parser.items(profile))
+
+
+def writer(index):
+    from aws import credstore
+    for i in range(WRITES):
+        credstore.put([new_row(i, 'https://writer' + str(index) + '.example.com')])
+
+
+def concurrent_writes():
+    start = time.perf_counter()
+    processes = [subprocess.Popen([sys.executable, os.path.abspath(__file__), '--writer', str(i)], cwd=APP_DIR) for i in range(WRITERS)]
+    codes = [process.wait() for process in processes]
+    return codes, (time.perf_counter() - start) * 1000
+
+
+def main():
+    from aws import credstore
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else PROFILES
+    credstore.put([new_row(i) for i in range(count)])
+    cred_file = os.path.join(util.get_cache_dir(), 'credentials')
+    credstore.export(cred_file)
+    profile = 'Role' + str(count // 2) + '_profile'
+    role = new_row(count // 2)['role']
+    results = [
+        measure('ini_read_profile_' + str(count), lambda: read_ini(cred_file, profile), 200),
+        measure('store_get_by_profile', lambda: credstore.get_by_profile(profile), 5000),
+        measure('store_get_by_role', lambda: credstore.get_by_role(role), 5000)
+    ]
+    credstore.close()
+    codes, elapsed = concurrent_writes()
+    written = len(credstore.query("SELECT role FROM credentials WHERE tenant LIKE 'https://writer%'"))
+    results.append({'name': 'concurrent_writers', 'writers': WRITERS, 'rows_expected': WRITERS * WRITES, 'rows_written': written, 'wall_ms': round(elapsed, 2)})
+    report('credstore', results)
+    if any(codes) or written != WRITERS * WRITES:
+        sys.stderr.write("Concurrent writers lost rows or failed\n")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 2 and sys.argv[1] == '--writer':
+        writer(int(sys.argv[2]))
+        sys.exit(0)
+    os.environ[util.CACHE_DIR_ENV] = tempfile.mkdtemp()
+    sys.exit(main())
@@ -0,0 +1,118 @@
+# Copyright 2019 CyberArk, LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+
+# Login-to-profile latency against the local mock tenant: runs AWSCLI.py in a
+# fresh interpreter with a private HOME and cache, logs in (password plus an
+# out-of-band mechanism), fetches the app list, clicks the app, assumes every
+# role through the STS stub and writes the credentials file. Each scenario
+# also reports the median per-phase timings from -trace.
+#
+#   python benchmarks/bench_e2e.py [runs]
+
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from common import APP_DIR, report
+from core import util
+from mocktenant import MockTenant
+
+RUNS = 5
+ROLES = 4
+SCENARIOS = [
+    ('e2e_text_startoob', ('Text', 'StartOob')),
+    ('e2e_text_starttextoob', ('Text', 'StartTextOob'))
+]
+
+
+def prepare(work_dir):
+    home = os.path.join(work_dir, 'home')
+    os.makedirs(os.path.join(home, '.aws'))
+    # proxy.properties is not committed; the mock tenant is always direct
+    with open(os.path.join(work_dir, 'proxy.properties'), 'w') as proxy_file:
+        proxy_file.write("[Proxy]\nproxy=no\nhttp_proxy=\nhttps_proxy=\nproxy_user=\nproxy_password=\n")
+    env = dict(os.environ)
+    env['HOME'] = home
+    env['USERPROFILE'] = home
+    env[util.CACHE_DIR_ENV] = os.path.join(work_dir, 'cache')
+    return env, os.path.join(home, '.aws', 'credentials')
+
+
+def login(tenant, env, work_dir, trace_file):
+    command = [sys.executable, os.path.join(APP_DIR, 'AWSCLI.py'), '-tenant', tenant.get_url(), '-user', 'user@example.com',
+               '-app', 'AWS Mock 0', '-allroles', '-nosessioncache', '-appcachettl', '0',
+               '-stsendpoint', tenant.get_sts_url(), '-trace', trace_file]
+    start = time.perf_counter()
+    # A new session has no controlling terminal, so getpass falls back to stdin
+    process = subprocess.run(command, input='password\n', env=env, cwd=work_dir, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                             universal_newlines=True, start_new_session=True)
+    return (time.perf_counter() - start) * 1000, process
+
+
+def get_phases(trace_file):
+    with open(trace_file) as trace:
+        spans = json.load(trace)['spans']
+    phases = {}
+    for span in spans:
+        if span['name'] != 'http':
+            phases[span['name']] = phases.get(span['name'], 0) + span['duration_ms']
+    return phases
+
+
+def run_scenario(name, mechanisms, runs):
+    timings = []
+    phases = {}
+    with MockTenant(mechanisms=mechanisms, roles=ROLES) as tenant:
+        for i in range(runs):
+            work_dir = tempfile.mkdtemp(prefix='idaptive-e2e-')
+            try:
+                env, cred_file = prepare(work_dir)
+                trace_file = os.path.join(work_dir, 'trace.json')
+                elapsed, process = login(tenant, env, work_dir, trace_file)
+                with open(cred_file) if os.path.exists(cred_file) else open(os.devnull) as creds:
+                    profiles = creds.read().count('aws_access_key_id')
+                if process.returncode != 0 or profiles != ROLES:
+                    sys.stderr.write(process.stdout + process.stderr)
+                    raise RuntimeError(name + " wrote " + str(profiles) + " profiles, expected " + str(ROLES))
+                timings.append(elapsed)
+                for phase, duration in get_phases(trace_file).items():
+                    phases.setdefault(phase, []).append(duration)
+            finally:
+                shutil.rmtree(work_dir, ignore_errors=True)
+        requests = dict(tenant.requests)
+    return {
+        'name': name,
+        'iterations': runs,
+        'median_ms': round(statistics.median(timings), 2),
+        'max_ms': round(max(timings), 2),
+        'phases_ms': dict((phase, round(statistics.median(values), 2)) for phase, values in sorted(phases.items())),
+        'requests': requests
+    }
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else RUNS
+    results = [run_scenario(name, mechanisms, runs) for name, mechanisms in SCENARIOS]
+    report('e2e', results)
+    return results
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+# Copyright 2019 CyberArk, LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+# getupdata for a user entitled to thousands of apps, served by the mock
+# tenant: the old full download plus response.json() and filter, against the
+# compressed, streamed parse that keeps only the AWS fields. Reports time,
+# bytes on the wire and the peak Python allocation of each.
+#
+#   python benchmarks/bench_getupdata.py [other_apps]
+
+import statistics
+import sys
+import time
+import tracemalloc
+from common import report
+from mocktenant import MockTenant
+from config.environment import Environment
+from core import appcatalog, restclient, timings, transport, uprest
+from core.authsession import AuthSession
+
+AWS_APPS = 50
+OTHER_APPS = 5000
+RUNS = 10
+
+
+def legacy(session, environment):
+    headers = uprest.get_headers(session)
+    headers['Accept-Encoding'] = 'identity'
+    response = restclient.call_rest_post(session.endpoint, "/uprest/getupdata", {}, headers, True, {}, False)
+    apps = appcatalog.filter_aws_apps(response.json()["Result"]["Apps"])
+    return apps, len(response.content)
+
+
+def streamed(session, environment):
+    apps = uprest.stream_applications('user@example.com', session, environment, {}, appcatalog.get_aws_fields)
+    # stream_applications adds the bytes read off the wire to its span
+    return apps, [span.bytes for span in timings.get_recorder().get_spans() if span.name == 'getupdata'][-1]
+
+
+def measure(name, func, session, environment, runs):
+    durations = []
+    for i in range(runs):
+        start = time.perf_counter()
+        apps, wire = func(session, environment)
+        durations.append((time.perf_counter() - start) * 1000)
+    tracemalloc.start()
+    func(session, environment)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'name': name, 'iterations': runs, 'median_ms': round(statistics.median(durations), 2), 'apps_kept': len(apps), 'wire_bytes': wire, 'peak_alloc_bytes': peak}
+
+
+def main():
+    other_apps = int(sys.argv[1]) if len(sys.argv) > 1 else OTHER_APPS
+    # streamed() reads the wire bytes back from the getupdata span
+    timings.get_recorder().enable()
+    with MockTenant(aws_apps=AWS_APPS, other_apps=other_apps) as tenant:
+        environment = Environment('mock', tenant.get_url(), True, False)
+        session = AuthSession(tenant.get_url(), 'user@example.com', 'session', 'token')
+        results = [measure('getupdata_json', legacy, session, environment, RUNS), measure('getupdata_streamed', streamed, session, environment, RUNS)]
+    transport.get_transport().close()
+    report('getupdata', results)
+    return results
+
+
+if __name__ == '__main__':
+    main()
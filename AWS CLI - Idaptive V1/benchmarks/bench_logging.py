@@ -0,0 +1,77 @@
+# Copyright 2019 CyberArk, LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+
+# Cost to the calling thread of logging a REST response, comparing the
+# previous synchronous FileHandler with eager concatenation against the
+# queued pipeline with lazy formatting.
+#
+#   python benchmarks/bench_logging.py
+
+import json
+import logging
+import os
+import tempfile
+from common import FakeResponse, measure, report
+from core import logpipeline
+from core.restclient import get_text
+from core.logpipeline import lazy
+
+APP_COUNT = 400
+
+
+def build_payload(count):
+    apps = [{'AppKey': 'a%04d-1111-2222-3333-444455556666' % i, 'DisplayName': 'App ' + str(i), 'TemplateName': 'AWSConsoleSAML', 'WebAppType': 'SAML', 'Icon': '/vfslow/lib/application/icons/' + 'x' * 80, 'Description': 'd' * 200} for i in range(count)]
+    return json.dumps({'success': True, 'Result': {'Apps': apps}})
+
+
+def reset_root():
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+        handler.close()
+
+
+def legacy(logfile, response):
+    reset_root()
+    logging.basicConfig(handlers=[logging.FileHandler(logfile, 'w', 'utf-8')], level=logging.INFO, format=logpipeline.LOG_FORMAT)
+    result = measure('log_response_legacy', lambda: logging.info("Received Response : " + response.text), 2000)
+    reset_root()
+    return result
+
+
+def pipeline(logfile, response):
+    reset_root()
+    logpipeline.setup(logfile)
+    result = measure('log_response_pipeline', lambda: logging.info("Received Response : %s", lazy(get_text, response)), 2000)
+    logpipeline.stop()
+    return result
+
+
+def main():
+    response = FakeResponse(build_payload(APP_COUNT))
+    with tempfile.TemporaryDirectory() as work_dir:
+        results = [
+            legacy(os.path.join(work_dir, 'legacy.log'), response),
+            pipeline(os.path.join(work_dir, 'pipeline.log'), response)
+        ]
+        results.append({'name': 'payload_bytes', 'value': len(response.text)})
+        results.append({'name': 'pipeline_log_bytes', 'value': os.path.getsize(os.path.join(work_dir, 'pipeline.log'))})
+    report('logging', results)
+    return results
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+# Copyright 2019 CyberArk, LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+# Role selection over an assertion with many roles spread across accounts:
+# building the RoleCatalog, then name, prefix, account scoped and ARN lookups
+# through its indexes, against a linear fnmatch scan of every ARN.
+#
+#   python benchmarks/bench_roles.py [roles]
+
+import fnmatch
+import sys
+from common import measure, report
+from core.rolecatalog import RoleCatalog
+
+ROLE_COUNT = 600
+ACCOUNTS = 20
+PATHS = ('', 'prod-team/', 'dev/')
+
+
+def build_roles(count):
+    roles = []
+    for i in range(count):
+        account = '%012d' % (100000000000 + i % ACCOUNTS)
+        roles.append(('arn:aws:iam::' + account + ':role/' + PATHS[i % len(PATHS)] + 'Role' + str(i), 'arn:aws:iam::' + account + ':saml-provider/Idaptive'))
+    return roles
+
+
+def linear(roles, pattern):
+    return [role for role, provider in roles if fnmatch.fnmatchcase(role.lower(), pattern)]
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else ROLE_COUNT
+    roles = build_roles(count)
+    catalog = RoleCatalog(roles)
+    arn = roles[count // 2][0]
+    results = [
+        measure('catalog_build_' + str(count) + '_roles', lambda: RoleCatalog(roles), 200),
+        measure('linear_glob_scan', lambda: linear(roles, '*:role/prod-team/role1*'), 2000),
+        measure('catalog_name', lambda: catalog.find('Role' + str(count // 2)), 20000),
+        measure('catalog_prefix', lambda: catalog.find('Role1*'), 20000),
+        measure('catalog_scoped_glob', lambda: catalog.find('prod-*/Role1*'), 5000),
+        measure('catalog_account', lambda: catalog.find('100000000007/Role*'), 5000),
+        measure('catalog_arn', lambda: catalog.find(arn), 20000)
+    ]
+    report('roles', results)
+    return results
+
+
+if __name__ == '__main__':
+    main()
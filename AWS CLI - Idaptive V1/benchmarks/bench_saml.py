@@ -0,0 +1,75 @@
+# Copyright 2019 CyberArk, LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+
+# Role extraction from a SAML assertion carrying many roles, comparing the
+# previous full-tree parse (repeated for every role selection) against the
+# streaming parser, both cold and memoized.
+#
+#   python benchmarks/bench_saml.py [roles]
+
+import base64
+import sys
+from common import measure, report
+from core import samlassertion
+from mocktenant import build_saml, get_roles
+
+ROLE_COUNT = 600
+
+
+def build_assertion(count):
+    return build_saml(get_roles(count))
+
+
+def legacy_choose(encoded_saml):
+    # What every choose_role call used to do: decode, log, build a tree for the
+    # roles and another one for the expiry
+    base64.b64decode(encoded_saml)
+    roles = []
+    root = samlassertion.decode_saml(encoded_saml)
+    for attribute in root.iter(samlassertion.ATTRIBUTE):
+        if (attribute.get('Name') == samlassertion.ROLE_ATTRIBUTE):
+            for value in attribute.iter(samlassertion.ATTRIBUTE_VALUE):
+                chunks = value.text.split(',')
+                roles.append((chunks[0], chunks[1]))
+    root = samlassertion.decode_saml(encoded_saml)
+    for tag in samlassertion.EXPIRY_TAGS:
+        for element in root.iter(tag):
+            samlassertion.parse_saml_time(element.get('NotOnOrAfter'))
+    return roles
+
+
+def streaming_cold(encoded_saml):
+    return samlassertion.parse_assertion(encoded_saml, '')
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else ROLE_COUNT
+    encoded_saml = build_assertion(count)
+    legacy_roles = legacy_choose(encoded_saml)
+    attributes = samlassertion.parse_saml(encoded_saml)
+    assert [role for role, provider in legacy_roles] == [role for role, provider in attributes.roles]
+    assert attributes.session_duration == 3600 and attributes.expiry is not None
+    results = [
+        measure('saml_roles_legacy_' + str(count), lambda: legacy_choose(encoded_saml), 200),
+        measure('saml_roles_streaming_' + str(count), lambda: streaming_cold(encoded_saml), 200),
+        measure('saml_roles_memoized_' + str(count), lambda: samlassertion.parse_saml(encoded_saml), 10000)
+    ]
+    report('saml', results)
+    return results
+
+
+if __name__ == '__main__':
+    main()
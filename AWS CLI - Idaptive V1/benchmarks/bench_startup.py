@@ -0,0 +1,87 @@
+# Copyright 2019 CyberArk, LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+# Cold start-up check for AWSCLI.py. Runs the paths that never need the
+# network (-version, -h and an argument error) in fresh interpreters, prints
+# the slowest top-level imports from -X importtime for -version, and fails
+# (exit 1) when heavy modules get imported on these paths or when the median
+# time on top of a bare interpreter start exceeds the budget.
+#
+#   python benchmarks/bench_startup.py
+
+import os
+import statistics
+import sys
+import tempfile
+from common import APP_DIR, parse_importtime, report, run_process
+
+BUDGET_MS = 50
+RUNS = 15
+TOP = 15
+HEAVY = ('boto3', 'botocore', 'requests', 'urllib3', 'colorama', 'xml.etree', 'core.auth', 'core.restclient')
+SCENARIOS = [
+    ('startup_version', ['-version']),
+    ('startup_help', ['-h']),
+    ('startup_argument_error', ['-duration', 'x'])
+]
+
+
+def get_command(arguments, extra=()):
+    return [sys.executable] + list(extra) + [os.path.join(APP_DIR, 'AWSCLI.py')] + arguments
+
+
+def main():
+    cwd = tempfile.mkdtemp(prefix='idaptive-bench-')
+    results = []
+    failed = False
+    for name, arguments in SCENARIOS:
+        baseline = []
+        timings = []
+        for i in range(RUNS):
+            baseline.append(run_process([sys.executable, '-c', 'pass'], cwd=cwd)[0])
+            timings.append(run_process(get_command(arguments), cwd=cwd)[0])
+        elapsed, process = run_process(get_command(arguments, ['-X', 'importtime']), cwd=cwd)
+        imports = parse_importtime(process.stderr)
+        heavy = sorted(set(module for module, self_us, cumulative_us in imports if module.startswith(HEAVY)))
+        overhead = statistics.median(timings) - statistics.median(baseline)
+        result = {
+            'name': name,
+            'iterations': RUNS,
+            'median_ms': round(statistics.median(timings), 2),
+            'interpreter_ms': round(statistics.median(baseline), 2),
+            'overhead_ms': round(overhead, 2),
+            'budget_ms': BUDGET_MS,
+            'heavy_imports': heavy
+        }
+        if (name == 'startup_version'):
+            # Leave out what the bare interpreter already imports (site, .pth hooks)
+            interpreter = run_process([sys.executable, '-X', 'importtime', '-c', 'pass'], cwd=cwd)[1]
+            preloaded = set(module for module, self_us, cumulative_us in parse_importtime(interpreter.stderr))
+            top_level = [entry for entry in imports if entry[0] not in preloaded]
+            top_level.sort(key=lambda entry: entry[2], reverse=True)
+            result['slowest_imports_us'] = [{'module': module, 'self': self_us, 'cumulative': cumulative_us} for module, self_us, cumulative_us in top_level[:TOP]]
+        results.append(result)
+        if heavy:
+            sys.stderr.write(name + " imported " + ", ".join(heavy) + "\n")
+            failed = True
+        if overhead > BUDGET_MS:
+            sys.stderr.write(name + " takes " + str(round(overhead, 2)) + " ms over interpreter start, budget is " + str(BUDGET_MS) + " ms\n")
+            failed = True
+    report('startup', results)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,85 @@
+# Copyright 2019 CyberArk, LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import json
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.dirname(BENCH_DIR)
+if APP_DIR not in sys.path:
+    sys.path.insert(0, APP_DIR)
+
+
+class FakeResponse(object):
+    '''
+    Minimal stand-in for requests.Response used by the component benchmarks
+    '''
+    def __init__(self, text, url='', cookies=None, headers=None):
+        self.text = text
+        self.url = url
+        self.cookies = cookies or {}
+        self.headers = headers or {}
+        self.status_code = 200
+
+
+def measure(name, func, iterations=10000):
+    for i in range(min(100, iterations)):
+        func()
+    start = time.perf_counter()
+    for i in range(iterations):
+        func()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    func()
+    tracemalloc.reset_peak()
+    base = tracemalloc.get_traced_memory()[0]
+    for i in range(100):
+        func()
+    peak = tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+    return {
+        'name': name,
+        'iterations': iterations,
+        'us_per_op': round(elapsed / iterations * 1000000, 3),
+        'peak_alloc_bytes': peak
+    }
+
+
+def report(suite, results):
+    print(json.dumps({'suite': suite, 'python': sys.version.split()[0], 'results': results}, indent=2))
+
+
+def run_process(command, env=None, cwd=None):
+    start = time.perf_counter()
+    process = subprocess.run(command, env=env, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+    return (time.perf_counter() - start) * 1000, process
+
+
+def parse_importtime(stderr):
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        fields = line[len('import time:'):].split('|')
+        try:
+            imports.append((fields[2].strip(), int(fields[0]), int(fields[1])))
+        except ValueError:
+            continue
+    return imports
+
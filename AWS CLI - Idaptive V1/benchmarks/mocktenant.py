@@ -0,0 +1,283 @@
+# Copyright 2019 CyberArk, LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+
+# In-process stand-in for an Idaptive tenant and for STS, used by the offline
+# benchmarks. Serves StartAuthentication (with a PodFqdn redirect from the
+# vanity address 127.0.0.1 to the pod address localhost), the Text, StartOob
+# and StartTextOob mechanisms, whoami, getupdata, handleAppClick with a SAML
+# form and an AssumeRoleWithSAML stub at /sts.
+
+import base64
+import gzip
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib import parse as urlparse
+
+MECHANISMS = {
+    'Text': {'Name': 'UP', 'AnswerType': 'Text', 'PromptSelectMech': 'Password'},
+    'StartOob': {'Name': 'OTP', 'AnswerType': 'StartOob', 'PromptSelectMech': 'Mobile Authenticator'},
+    'StartTextOob': {'Name': 'EMAIL', 'AnswerType': 'StartTextOob', 'PromptSelectMech': 'Email'}
+}
+
+ASSERTION = '''<?xml version="1.0" encoding="UTF-8"?>
+<saml2p:Response xmlns:saml2p="urn:oasis:names:tc:SAML:2.0:protocol" ID="_%(id)s" Version="2.0">
+<saml2:Assertion xmlns:saml2="urn:oasis:names:tc:SAML:2.0:assertion" ID="_a%(id)s" Version="2.0">
+<saml2:Issuer>https://tenant.my.idaptive.app/1234</saml2:Issuer>
+<ds:Signature xmlns:ds="http://www.w3.org/2000/09/xmldsig#"><ds:SignatureValue>%(signature)s</ds:SignatureValue></ds:Signature>
+<saml2:Subject><saml2:NameID>%(user)s</saml2:NameID>
+<saml2:SubjectConfirmation Method="urn:oasis:names:tc:SAML:2.0:cm:bearer"><saml2:SubjectConfirmationData NotOnOrAfter="%(expires)s" Recipient="https://signin.aws.amazon.com/saml"/></saml2:SubjectConfirmation>
+</saml2:Subject>
+<saml2:Conditions NotBefore="%(issued)s" NotOnOrAfter="%(expires)s"><saml2:AudienceRestriction><saml2:Audience>urn:amazon:webservices</saml2:Audience></saml2:AudienceRestriction></saml2:Conditions>
+<saml2:AttributeStatement>
+<saml2:Attribute Name="https://aws.amazon.com/SAML/Attributes/RoleSessionName"><saml2:AttributeValue>%(user)s</saml2:AttributeValue></saml2:Attribute>
+<saml2:Attribute Name="https://aws.amazon.com/SAML/Attributes/SessionDuration"><saml2:AttributeValue>3600</saml2:AttributeValue></saml2:Attribute>
+<saml2:Attribute Name="https://aws.amazon.com/SAML/Attributes/Role">%(roles)s</saml2:Attribute>
+</saml2:AttributeStatement>
+</saml2:Assertion>
+</saml2p:Response>'''
+
+ROLE_VALUE = '<saml2:AttributeValue>%(role)s,%(provider)s</saml2:AttributeValue>'
+
+APP_FORM = '''<html><body onload="document.forms[0].submit()">
+<form method="post" action="https://signin.aws.amazon.com/saml">
+<input type="hidden" name="SAMLResponse" value="%(saml)s"/>
+</form></body></html>'''
+
+STS_RESPONSE = '''<AssumeRoleWithSAMLResponse xmlns="https://sts.amazonaws.com/doc/2011-06-15/">
+<AssumeRoleWithSAMLResult>
+<Audience>https://signin.aws.amazon.com/saml</Audience>
+<AssumedRoleUser><AssumedRoleId>AROAMOCK:%(user)s</AssumedRoleId><Arn>%(role)s/%(user)s</Arn></AssumedRoleUser>
+<Credentials>
+<AccessKeyId>ASIAMOCK%(serial)08d</AccessKeyId>
+<SecretAccessKey>mock-secret-%(serial)d</SecretAccessKey>
+<SessionToken>mock-token-%(serial)d</SessionToken>
+<Expiration>%(expires)s</Expiration>
+</Credentials>
+<Subject>%(user)s</Subject>
+<SubjectType>unspecified</SubjectType>
+<Issuer>https://tenant.my.idaptive.app/1234</Issuer>
+</AssumeRoleWithSAMLResult>
+<ResponseMetadata><RequestId>%(request_id)s</RequestId></ResponseMetadata>
+</AssumeRoleWithSAMLResponse>'''
+
+
+def iso_time(epoch):
+    return time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(epoch))
+
+def get_roles(count):
+    return [('arn:aws:iam::%012d:role/MockRole%d' % (100000000000 + i // 4, i), 'arn:aws:iam::%012d:saml-provider/Idaptive' % (100000000000 + i // 4)) for i in range(count)]
+
+def build_saml(roles, user='user@example.com', lifetime=300):
+    now = time.time()
+    xml = ASSERTION % {
+        'id': uuid.uuid4().hex,
+        'signature': 'A' * 344,
+        'user': user,
+        'issued': iso_time(now),
+        'expires': iso_time(now + lifetime),
+        'roles': ''.join(ROLE_VALUE % {'role': role, 'provider': provider} for role, provider in roles)
+    }
+    return base64.b64encode(xml.encode('utf-8')).decode('ascii')
+
+def build_app_form(encoded_saml):
+    return APP_FORM % {'saml': encoded_saml}
+
+def build_apps(aws_apps=2, other_apps=3):
+    apps = []
+    for i in range(aws_apps):
+        apps.append({'AppKey': 'aws-app-%04d' % i, 'DisplayName': 'AWS Mock ' + str(i), 'TemplateName': 'AWSConsoleSAML', 'WebAppType': 'SAML', 'Icon': '/vfslow/lib/application/icons/aws.png', 'Description': 'Mock AWS account ' + str(i)})
+    for i in range(other_apps):
+        apps.append({'AppKey': 'other-app-%04d' % i, 'DisplayName': 'Other ' + str(i), 'TemplateName': 'GenericSAML', 'WebAppType': 'SAML', 'Icon': '/vfslow/lib/application/icons/app.png', 'Description': 'Not an AWS app'})
+    return apps
+
+
+class MockTenant(object):
+    '''
+    Threaded HTTP server on 127.0.0.1 playing tenant, pod and STS
+    '''
+    def __init__(self, mechanisms=('Text', 'StartOob'), oob_polls=2, roles=4, aws_apps=2, other_apps=3, redirect=True, latency=0, connect_latency=0):
+        self.mechanisms = list(mechanisms)
+        self.oob_polls = oob_polls
+        self.roles = get_roles(roles)
+        self.apps = build_apps(aws_apps, other_apps)
+        self.redirect = redirect
+        # Seconds added to every response, to stand in for a real round trip
+        self.latency = latency
+        # Seconds added once per new connection, to stand in for the TCP/TLS
+        # handshake
+        self.connect_latency = connect_latency
+        self.sessions = {}
+        self.apps_document = None
+        self.requests = {}
+        self.serial = 0
+        self.lock = threading.Lock()
+        self.server = None
+        self.port = None
+        self.thread = None
+
+    def get_url(self):
+        return 'http://127.0.0.1:' + str(self.port)
+
+    def get_pod(self):
+        return 'localhost:' + str(self.port)
+
+    def get_sts_url(self):
+        return self.get_url() + '/sts'
+
+    def start(self):
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), MockHandler)
+        self.server.daemon_threads = True
+        self.server.tenant = self
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, name='mock-tenant', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def get_apps_document(self):
+        # Built once, so a large app list costs the benchmarks' memory
+        # measurements nothing on the server side
+        with self.lock:
+            if self.apps_document is None:
+                data = json.dumps({'success': True, 'Result': {'Apps': self.apps}}).encode('utf-8')
+                self.apps_document = (data, 'application/json', None, gzip.compress(data, 6))
+            return self.apps_document
+
+    def count(self, path):
+        with self.lock:
+            self.requests[path] = self.requests.get(path, 0) + 1
+
+    def next_serial(self):
+        with self.lock:
+            self.serial += 1
+            return self.serial
+
+    def get_challenges(self):
+        challenges = []
+        for i, name in enumerate(self.mechanisms):
+            mechanism = dict(MECHANISMS[name])
+            mechanism['MechanismId'] = 'mech-' + str(i)
+            challenges.append({'Mechanisms': [mechanism]})
+        return challenges
+
+    def start_authentication(self, host, body):
+        if self.redirect and not host.startswith('localhost'):
+            return {'success': True, 'Result': {'PodFqdn': self.get_pod()}}
+        session_id = uuid.uuid4().hex
+        with self.lock:
+            self.sessions[session_id] = {'user': body.get('User'), 'step': 0, 'polls': 0}
+        return {'success': True, 'Result': {'SessionId': session_id, 'TenantId': 'MOCK1234', 'Challenges': self.get_challenges()}}
+
+    def advance_authentication(self, body):
+        with self.lock:
+            state = self.sessions.get(body.get('SessionId'))
+        if state is None:
+            return {'success': False, 'Message': 'Unknown session'}, None
+        action = body.get('Action')
+        if (action == 'StartOOB'):
+            return {'success': True, 'Result': {'Summary': 'OobPending', 'GeneratedAuthValue': '42'}}, None
+        if (action == 'Poll'):
+            state['polls'] += 1
+            if state['polls'] <= self.oob_polls:
+                return {'success': True, 'Result': {'Summary': 'OobPending', 'GeneratedAuthValue': '42'}}, None
+            state['polls'] = 0
+        state['step'] += 1
+        if state['step'] < len(self.mechanisms):
+            return {'success': True, 'Result': {'Summary': 'StartNextChallenge'}}, None
+        token = uuid.uuid4().hex
+        return {'success': True, 'Result': {'Summary': 'LoginSuccess', 'Auth': token}}, '.ASPXAUTH=' + token + '; path=/; expires=' + time.strftime('%a, %d %b %Y %H:%M:%S GMT', time.gmtime(time.time() + 3600))
+
+    def assume_role_with_saml(self, form):
+        role = form.get('RoleArn', [''])[0]
+        duration = int(form.get('DurationSeconds', ['3600'])[0])
+        return STS_RESPONSE % {'user': 'user@example.com', 'role': role, 'serial': self.next_serial(), 'expires': iso_time(time.time() + duration), 'request_id': uuid.uuid4()}
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out in separate writes; without this every
+    # keep-alive response waits on the peer's delayed ACK
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        if self.server.tenant.connect_latency:
+            time.sleep(self.server.tenant.connect_latency)
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_body(self, body, content_type='application/json', headers=None, gzipped=None):
+        data = body.encode('utf-8') if isinstance(body, str) else body
+        self.send_response(200)
+        if gzipped is not None and 'gzip' in self.headers.get('Accept-Encoding', ''):
+            data = gzipped
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_HEAD(self):
+        # Connection warm-up probes
+        self.server.tenant.count('HEAD')
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_POST(self):
+        tenant = self.server.tenant
+        length = int(self.headers.get('Content-Length') or 0)
+        raw = self.rfile.read(length).decode('utf-8') if length else ''
+        path = urlparse.urlsplit(self.path).path.rstrip('/')
+        tenant.count(path)
+        if tenant.latency:
+            time.sleep(tenant.latency)
+        if (path == '/sts'):
+            return self.send_body(tenant.assume_role_with_saml(urlparse.parse_qs(raw)), 'text/xml')
+        try:
+            body = json.loads(raw) if raw.strip() else {}
+        except ValueError:
+            body = {}
+        if (path == '/Security/StartAuthentication'):
+            return self.send_body(json.dumps(tenant.start_authentication(self.headers.get('Host', ''), body)))
+        if (path == '/Security/AdvanceAuthentication'):
+            result, cookie = tenant.advance_authentication(body)
+            headers = {'Retry-After': '0.01'}
+            if cookie:
+                headers['Set-Cookie'] = cookie
+            return self.send_body(json.dumps(result), headers=headers)
+        if (path == '/Security/whoami'):
+            return self.send_body(json.dumps({'success': True, 'Result': {'User': 'user@example.com'}}))
+        if (path == '/uprest/getupdata'):
+            return self.send_body(*tenant.get_apps_document())
+        if (path == '/uprest/handleAppClick'):
+            return self.send_body(build_app_form(build_saml(tenant.roles)), 'text/html')
+        self.send_error(404)
@@ -0,0 +1,84 @@
+# Copyright 2019 CyberArk, LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+
+# Runs every benchmarks/bench_*.py in its own interpreter and merges their
+# reports into one JSON document tagged with the git revision, so results can
+# be diffed between revisions. Exits 1 if any benchmark (including the budget
+# checks) failed.
+#
+#   python benchmarks/run_all.py [output.json]
+
+import glob
+import json
+import os
+import subprocess
+import sys
+import time
+from common import BENCH_DIR, run_process
+
+
+def get_revision():
+    try:
+        process = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=BENCH_DIR, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, universal_newlines=True)
+        return process.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def parse_report(stdout):
+    start = stdout.find('{\n')
+    if start < 0:
+        return None
+    try:
+        return json.loads(stdout[start:])
+    except ValueError:
+        return None
+
+
+def main():
+    suites = []
+    failed = []
+    for script in sorted(glob.glob(os.path.join(BENCH_DIR, 'bench_*.py'))):
+        name = os.path.basename(script)
+        sys.stderr.write("Running " + name + "\n")
+        elapsed, process = run_process([sys.executable, script], cwd=BENCH_DIR)
+        suite = parse_report(process.stdout)
+        if process.returncode != 0 or suite is None:
+            failed.append(name)
+            sys.stderr.write(process.stdout + process.stderr)
+        if suite is not None:
+            suite['script'] = name
+            suite['exit_code'] = process.returncode
+            suite['wall_ms'] = round(elapsed, 2)
+            suites.append(suite)
+    output = json.dumps({
+        'revision': get_revision(),
+        'date': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'python': sys.version.split()[0],
+        'platform': sys.platform,
+        'suites': suites,
+        'failed': failed
+    }, indent=2)
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], 'w') as output_file:
+            output_file.write(output + "\n")
+    else:
+        print(output)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -16,11 +16,12 @@ import logging
 
 class Environment(object):
 
-    def __init__(self, name, endpoint, certpath, debug):
+    def __init__(self, name, endpoint, certpath, debug, poll_timeout=300):
         self.name = name
         self.endpoint = endpoint
         self.certpath = certpath
         self.debug = debug
+        self.poll_timeout = poll_timeout
         self.applications = []
         
         
@@ -44,6 +45,9 @@ class Environment(object):
     def get_debug(self):
         return self.debug
     
+    def get_poll_timeout(self):
+        return self.poll_timeout
+    
     def get_apps_properties(self):
         return self.apps_properties
     
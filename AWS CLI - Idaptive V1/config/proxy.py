@@ -16,12 +16,13 @@ import logging
 
 class Proxy(object):
 
-    def __init__(self, isproxy, proxy_http, proxy_https, proxy_user, proxy_password):
+    def __init__(self, isproxy, proxy_http, proxy_https, proxy_user, proxy_password, no_proxy=''):
         self.isproxy = isproxy
         self.proxy_http = proxy_http
         self.proxy_https = proxy_https
         self.proxy_user = proxy_user
         self.proxy_password = proxy_password
+        self.no_proxy = no_proxy
         
         
     def log(self):
@@ -30,6 +31,7 @@ class Proxy(object):
         logging.info(self.proxy_http)
         logging.info(self.proxy_https)
         logging.info(self.proxy_user)
+        logging.info(self.no_proxy)
         logging.info('********')
         
     def is_proxy(self):
@@ -45,4 +47,7 @@ class Proxy(object):
         return self.proxy_user
     
     def get_password(self):
-        return self.proxy_password
\ No newline at end of file
+        return self.proxy_password
+    
+    def get_no_proxy(self):
+        return self.no_proxy
@@ -13,6 +13,7 @@
 # limitations under the License.
 
 import configparser
+import os
 import base64
 from getpass import getpass
 import logging
@@ -24,19 +25,53 @@ def set_logging():
     logging.basicConfig(filename='config.log', level=logging.INFO)
     logging.info('Starting App..')
     
+PROXY_FILE = 'proxy.properties'
+
+def get_config_paths(name):
+    # The working directory first, as before, then beside the script and the
+    # user's home directory
+    script_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return [os.path.abspath(name), os.path.join(script_dir, name), os.path.join(os.path.expanduser("~"), name)]
+
+def find_config(name):
+    for path in get_config_paths(name):
+        if os.path.isfile(path):
+            return path
+    return None
+
 def read_proxy():
     file_reader = configparser.ConfigParser()
-    config_file = 'proxy.properties'
+    config_file = find_config(PROXY_FILE)
+    if config_file is None:
+        raise IOError(PROXY_FILE + " not found in " + ", ".join(get_config_paths(PROXY_FILE)))
+    logging.info("Reading proxy settings from %s", config_file)
     file_reader.read(config_file)
     isproxy = file_reader['Proxy']['proxy']
     http_proxy = file_reader['Proxy']['http_proxy']
     https_proxy = file_reader['Proxy']['https_proxy']
     proxy_user = file_reader['Proxy']['proxy_user']
     proxy_password = file_reader['Proxy']['proxy_password']
-    proxy_object = proxy.Proxy(isproxy, http_proxy, https_proxy, proxy_user, proxy_password)
+    no_proxy = file_reader['Proxy'].get('no_proxy', '')
+    proxy_object = proxy.Proxy(isproxy, http_proxy, https_proxy, proxy_user, proxy_password, no_proxy)
     return proxy_object
     
        
+def read_tenants(path):
+    # One section per login:
+    #   [acme]
+    #   tenant=acme.idaptive.app   (defaults to the section name)
+    #   user=alice@acme.com        (prompted for when empty)
+    #   app=Prod*, Audit           (optional, overrides -app)
+    file_reader = configparser.ConfigParser()
+    if not file_reader.read(path):
+        raise IOError(path + " not found")
+    logins = []
+    for section in file_reader.sections():
+        values = file_reader[section]
+        apps = [app.strip() for app in values.get('app', '').split(',') if app.strip()]
+        logins.append((values.get('tenant', section).strip() or section, values.get('user', '').strip() or None, apps or None))
+    return logins
+       
 def log_config(proxy):
     proxy.log()
         
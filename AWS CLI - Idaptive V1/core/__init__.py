@@ -11,13 +11,3 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
-
-
-from core import adv_authrequest
-from core import authrequest
-from core import authresponse
-from core import auth
-from core import authsession
-from core import restclient
-from core import htmlparser
-from core import htmlresponse
@@ -0,0 +1,152 @@
+# Copyright 2019 CyberArk, LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+
+import fnmatch
+import json
+import logging
+import os
+import threading
+import time
+from core import uprest, util
+
+CACHE_FILE = 'apps.json'
+# How long a fetched app list is trusted before getupdata is called again.
+# A selector that matches nothing in a cached list also forces a refresh.
+DEFAULT_CATALOG_TTL = 3600
+APP_FIELDS = ('AppKey', 'DisplayName', 'TemplateName', 'WebAppType')
+PATTERN_CHARS = '*?['
+
+_lock = threading.Lock()
+
+
+def is_aws_app(app):
+    try:
+        template_name = app["TemplateName"]
+        return ("AWS" in template_name or "Amazon" in template_name) and app["WebAppType"] != 'UsernamePassword'
+    except (KeyError, TypeError):
+        return False
+
+def get_aws_fields(app):
+    if not is_aws_app(app):
+        return None
+    return dict((field, app.get(field)) for field in APP_FIELDS)
+
+def filter_aws_apps(apps):
+    return [kept for kept in map(get_aws_fields, apps) if kept is not None]
+
+
+class AppCatalog(object):
+    '''
+    The user's AWS apps, indexed by AppKey and by DisplayName
+    '''
+    def __init__(self, apps, fetched=None, cached=False):
+        self.apps = apps
+        self.fetched = fetched or time.time()
+        self.cached = cached
+        self.by_key = {}
+        self.by_name = {}
+        for app in apps:
+            self.by_key[app['AppKey']] = app
+            self.by_name.setdefault(app['DisplayName'].lower(), []).append(app)
+
+    def __len__(self):
+        return len(self.apps)
+
+    def get(self, appkey):
+        return self.by_key.get(appkey)
+
+    def find(self, selector):
+        app = self.by_key.get(selector)
+        if app is not None:
+            return [app]
+        apps = self.by_name.get(selector.lower())
+        if apps:
+            return list(apps)
+        if any(char in selector for char in PATTERN_CHARS):
+            pattern = selector.lower()
+            return [app for app in self.apps if fnmatch.fnmatchcase(app['DisplayName'].lower(), pattern)]
+        return []
+
+    def select(self, selectors):
+        selected = []
+        missing = []
+        for selector in selectors:
+            apps = self.find(selector)
+            if not apps:
+                missing.append(selector)
+            for app in apps:
+                if app not in selected:
+                    selected.append(app)
+        return selected, missing
+
+
+def get_cache_key(tenant, username):
+    return tenant.lower().rstrip('/') + '|' + username.lower()
+
+def get_cache_file():
+    return os.path.join(util.get_cache_dir(), CACHE_FILE)
+
+def read_cache():
+    try:
+        with open(get_cache_file(), 'r') as cache_file:
+            return json.load(cache_file)
+    except (IOError, ValueError):
+        return {}
+
+def load(tenant, username, ttl=DEFAULT_CATALOG_TTL):
+    entry = read_cache().get(get_cache_key(tenant, username))
+    if entry is None:
+        return None
+    if entry.get('fetched', 0) + ttl <= time.time():
+        logging.info("Cached app list for " + username + " is older than " + str(ttl) + " seconds")
+        return None
+    return AppCatalog(entry['apps'], entry['fetched'], True)
+
+def save(tenant, username, catalog, ttl=DEFAULT_CATALOG_TTL):
+    with _lock:
+        entries = read_cache()
+        now = time.time()
+        entries = dict((key, value) for key, value in entries.items() if value.get('fetched', 0) + ttl > now)
+        entries[get_cache_key(tenant, username)] = {'fetched': catalog.fetched, 'apps': catalog.apps}
+        util.write_private_file(get_cache_file(), json.dumps(entries, indent=1))
+
+def fetch(user, session, environment, proxy):
+    # Non-AWS apps and unused fields are dropped while the list streams in
+    awsapps = uprest.stream_applications(user, session, environment, proxy, get_aws_fields)
+    logging.info("AWSapps : %s", awsapps)
+    return AppCatalog(awsapps)
+
+def get_catalog(user, session, environment, proxy, ttl=DEFAULT_CATALOG_TTL, refresh=False):
+    tenant = environment.get_endpoint()
+    if not refresh and ttl > 0:
+        catalog = load(tenant, user, ttl)
+        if catalog is not None:
+            logging.info("Using cached app list for " + user + " fetched " + time.ctime(catalog.fetched))
+            return catalog
+    catalog = fetch(user, session, environment, proxy)
+    if ttl > 0:
+        save(tenant, user, catalog, ttl)
+    return catalog
+
+def select_apps(selectors, user, session, environment, proxy, ttl=DEFAULT_CATALOG_TTL, refresh=False):
+    catalog = get_catalog(user, session, environment, proxy, ttl, refresh)
+    selected, missing = catalog.select(selectors)
+    if missing and catalog.cached:
+        # The app may have been assigned after the list was cached
+        logging.info("No cached app matches " + str(missing) + ", refreshing the app list")
+        catalog = get_catalog(user, session, environment, proxy, ttl, True)
+        selected, missing = catalog.select(selectors)
+    return catalog, selected, missing
@@ -0,0 +1,122 @@
+# Copyright 2019 CyberArk, LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+
+# asyncio front end for the blocking REST helpers. Each call runs on a worker
+# thread over the shared pooled transport, so stages that do not depend on
+# each other (the app list, clicks on several apps, logins to several
+# tenants) overlap instead of queueing behind one another. prepare_apps and
+# login_tenants are the synchronous entry points used by the CLI.
+
+import asyncio
+import functools
+import logging
+import re
+from concurrent.futures import ThreadPoolExecutor
+from core import appcatalog, auth, restclient, samlapp
+
+DEFAULT_WORKERS = 8
+APPKEY_PATTERN = re.compile(r'^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}$')
+
+
+class AsyncEngine(object):
+    '''
+    Runs blocking calls on a private thread pool from asyncio coroutines
+    '''
+    def __init__(self, workers=DEFAULT_WORKERS):
+        self.workers = workers
+        self.executor = None
+
+    def __enter__(self):
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='async-engine')
+        return self
+
+    def __exit__(self, *exc_info):
+        self.executor.shutdown(wait=True)
+        self.executor = None
+
+    async def call(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+
+    async def post(self, endpoint, method, body, headers, certpath, proxy, debug):
+        return await self.call(restclient.call_rest_post, endpoint, method, body, headers, certpath, proxy, debug)
+
+    async def select_apps(self, selectors, user, session, environment, proxy, ttl, refresh):
+        return await self.call(appcatalog.select_apps, selectors, user, session, environment, proxy, ttl, refresh)
+
+    async def click(self, session, appkey, environment, proxy):
+        try:
+            # Apps that need MFA elevation are left to the sequential flow,
+            # which prompts for them one at a time
+            return await self.call(samlapp.call_app, session, appkey, "1.0", environment, proxy, interactive=False)
+        except (Exception, SystemExit) as e:
+            # Left to the sequential flow, which reports the failure as before
+            logging.info("Prefetching SAML for %s failed : %s", appkey, e)
+            return None
+
+    def get_known_keys(self, selectors, user, environment):
+        # App keys that can be clicked before getupdata answers: selectors
+        # that are app keys themselves, or that resolve against the last
+        # app list on disk even if it is past its TTL
+        keys = [selector for selector in selectors if APPKEY_PATTERN.match(selector)]
+        stale = appcatalog.load(environment.get_endpoint(), user, float('inf'))
+        if stale is not None:
+            selected, missing = stale.select(selectors)
+            keys.extend(app['AppKey'] for app in selected)
+        return list(dict.fromkeys(keys))
+
+    async def prepare_apps(self, selectors, user, session, environment, proxy, ttl, refresh):
+        early = self.get_known_keys(selectors, user, environment)
+        clicks = dict((appkey, asyncio.ensure_future(self.click(session, appkey, environment, proxy))) for appkey in early)
+        catalog, selected, missing = await self.select_apps(selectors, user, session, environment, proxy, ttl, refresh)
+        if not missing:
+            for app in selected:
+                if app['AppKey'] not in clicks:
+                    clicks[app['AppKey']] = asyncio.ensure_future(self.click(session, app['AppKey'], environment, proxy))
+        if clicks:
+            await asyncio.gather(*clicks.values())
+        logging.info("Prefetched SAML for %d app(s), %d before the app list arrived", len(clicks), len(early))
+        return catalog, selected, missing
+
+    def login_labelled(self, label, user, environment, proxy, use_cache):
+        auth.set_prompt_label(label)
+        try:
+            return auth.cached_login(user, "1.0", proxy, environment, use_cache)
+        finally:
+            auth.set_prompt_label(None)
+
+    async def login(self, label, user, environment, proxy, use_cache):
+        try:
+            return await self.call(self.login_labelled, label, user, environment, proxy, use_cache)
+        except (Exception, SystemExit) as e:
+            # One tenant failing must not take the other logins down
+            logging.exception("Login to %s failed : %s", label, e)
+            return None
+
+    async def login_all(self, logins, proxy, use_cache):
+        # Starts every login at once; their prompts take turns on the
+        # terminal while the others poll for out of band approval
+        return await asyncio.gather(*[self.login(label, user, environment, proxy, use_cache) for label, user, environment in logins])
+
+def run(coroutine_function, *args, workers=DEFAULT_WORKERS):
+    with AsyncEngine(workers) as engine:
+        return asyncio.run(coroutine_function(engine, *args))
+
+def prepare_apps(selectors, user, session, environment, proxy, ttl=appcatalog.DEFAULT_CATALOG_TTL, refresh=False, workers=DEFAULT_WORKERS):
+    return run(AsyncEngine.prepare_apps, selectors, user, session, environment, proxy, ttl, refresh, workers=workers)
+
+def login_tenants(logins, proxy, use_cache=True):
+    return run(AsyncEngine.login_all, logins, proxy, use_cache, workers=max(1, len(logins)))
@@ -12,14 +12,18 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from core.restclient import call_rest_post
+from core.restclient import call_rest_post, get_text
+from core.logpipeline import lazy
 from core.authrequest import AuthRequest
 from core.authresponse import AuthResponse
 from core.adv_authrequest import AdvAuthRequest
 from getpass import getpass
 from core.authsession import AuthSession
+from core.pollscheduler import PollScheduler
+from core import podcache, sessioncache, timings, warmup
 import logging
 import sys
+import threading
 import time
 from threading import Thread
 from kbread import kbinput
@@ -29,11 +33,48 @@ from core import authresponse
 import urllib
 from urllib import parse as urlparse
 import json
-from colorama import Fore, Back, Style
 
 
-result = []
 done = False
+# Logins to several tenants run on worker threads; one prompt is on screen at
+# a time and is prefixed with the tenant it belongs to
+prompt_lock = threading.RLock()
+prompt_context = threading.local()
+
+def set_prompt_label(label):
+    prompt_context.label = label
+
+def get_prompt_label():
+    label = getattr(prompt_context, 'label', None)
+    return "[" + label + "] " if label else ""
+
+def prompt(text, secret=False):
+    with prompt_lock:
+        warmup.refresh()
+        if secret:
+            return getpass(get_prompt_label() + text)
+        return input(get_prompt_label() + text)
+
+def start_on_cached_pod(pod, json_body, proxy, environment):
+    tenant = environment.get_endpoint()
+    endpoint = urlparse.urlsplit(tenant).scheme + "://" + pod
+    logging.info("Starting Authentication on cached pod %s", endpoint)
+    try:
+        with timings.span('start_authentication', pod=pod):
+            response = call_rest_post(endpoint, "/Security/StartAuthentication", json_body, {}, environment.get_certpath(), proxy, environment.get_debug(), False)
+        authresponse = AuthResponse(response, endpoint)
+    except Exception as e:
+        logging.info("Cached pod %s for %s failed : %s", pod, tenant, e)
+        return None
+    # A pod that does not serve this tenant redirects, refuses the request or
+    # names another pod; any of these means the cached mapping is stale.
+    # Other failures (unknown user, disabled account) come from the tenant
+    # itself and are handled like on the tenant URL.
+    redirected = response.history or response.status_code != 200
+    if redirected or 'PodFqdn' in authresponse.result:
+        logging.info("Cached pod %s did not accept the login for %s", pod, tenant)
+        return None
+    return authresponse
 
 def start_authentication(username, version, proxy, environment):
     endpoint = environment.get_endpoint()
@@ -43,12 +84,22 @@ def start_authentication(username, version, proxy, environment):
     message = AuthRequest('', username, version)
     json_body = message.get_start_auth_json()
     headers = {}
+    pod = podcache.load(endpoint)
+    if pod is not None:
+        authresponse = start_on_cached_pod(pod, json_body, proxy, environment)
+        if authresponse is not None:
+            if (authresponse.get_success_result() == False):
+                print(get_prompt_label() + "Invalid User")
+                sys.exit(0)
+            return authresponse
+        podcache.remove(endpoint)
     logging.info("Starting Authentication .. ")
-    response = call_rest_post(endpoint, method, json_body, headers, certpath, proxy, debug)
+    with timings.span('start_authentication'):
+        response = call_rest_post(endpoint, method, json_body, headers, certpath, proxy, debug)
     authresponse = AuthResponse(response, endpoint)
     success_result = authresponse.get_success_result()
     if (success_result == False):
-        print("Invalid User")
+        print(get_prompt_label() + "Invalid User")
         sys.exit(0)
     if (success_result == True):
         try:
@@ -58,11 +109,16 @@ def start_authentication(username, version, proxy, environment):
             logging.info('Seems we have tenant URL already ')
             return authresponse
         
-    endpoint = "https://"+tenant_url
-    logging.info("Redirecting to " + endpoint)
+    # The pod is reached the same way as the tenant URL it was returned by
+    tenant = endpoint
+    endpoint = urlparse.urlsplit(endpoint).scheme + "://" + tenant_url
+    logging.info("Redirecting to %s", endpoint)
     logging.info("Authenticating on the tenant..")
-    response = call_rest_post(endpoint, method, json_body, headers, certpath, proxy, environment.get_debug())
+    with timings.span('pod_redirect'):
+        response = call_rest_post(endpoint, method, json_body, headers, certpath, proxy, environment.get_debug())
     tenant_resp = AuthResponse(response, endpoint)
+    if (tenant_resp.get_success_result() == True):
+        podcache.save(tenant, tenant_url)
     return tenant_resp
     
 def advance_authentication(tenant_response, endpoint, username, version, proxy, environment):
@@ -72,40 +128,69 @@ def advance_authentication(tenant_response, endpoint, username, version, proxy,
     challenges = tenant_response.get_challenges()
     challenge_count = 0
     for challenge in challenges:
-        logging.info("Starting Challenge " + str(challenge_count))
+        logging.info("Starting Challenge %d", challenge_count)
         challenge_count = challenge_count + 1
         total_mechanism = len(challenge['Mechanisms'])
-        logging.info("There are " + str(total_mechanism) + " mechanisms")
+        logging.info("There are %d mechanisms", total_mechanism)
         
         if (total_mechanism > 1):
             again = True
-            while(again):
-                for key, value in challenge.items():
-                    count = 1
-                    for mechanism in value:
-                        print(str(count) + " : " + mechanism['PromptSelectMech'])
-                        count = count + 1
-                    choice = input("Please choose the mechanism : ")
-                try:
-                    if (int(choice) >= count or int(choice) <= 0):
+            with prompt_lock:
+                while(again):
+                    for key, value in challenge.items():
+                        count = 1
+                        for mechanism in value:
+                            print(get_prompt_label() + str(count) + " : " + mechanism['PromptSelectMech'])
+                            count = count + 1
+                        choice = prompt("Please choose the mechanism : ")
+                    try:
+                        if (int(choice) >= count or int(choice) <= 0):
+                            continue
+                    except ValueError:
                         continue
-                except ValueError:
-                    continue
-                mechanism = value[int(choice)-1]
-                again = False
+                    mechanism = value[int(choice)-1]
+                    again = False
         else:
             mechanism = challenge['Mechanisms'][0]
-        logging.info("Mechanism is " + str(mechanism))
+        logging.info("Mechanism is %s", mechanism)
         session = advance_auth_for_mech(mechanism, tenant_response, username, endpoint, method, proxy, environment)
     return session
 
 def get_user_choice():
-    print("Select from following :")
-    print("1. Use OTP")
-    print("2. Use URL")
-    return input("Enter (1) or (2) to select: ")
+    with prompt_lock:
+        print(get_prompt_label() + "Select from following :")
+        print("1. Use OTP")
+        print("2. Use URL")
+        return prompt("Enter (1) or (2) to select: ")
+
+def poll_authentication(endpoint, method, json_req, headers, proxy, environment, on_response=None):
+    from colorama import Fore, Style
+    scheduler = PollScheduler(deadline=environment.get_poll_timeout())
+    with timings.span('mfa_poll'):
+        while (True):
+            authresp = call_rest_post(endpoint, method, json_req, headers, environment.get_certpath(), proxy, environment.get_debug())
+            scheduler.record_poll()
+            resp = AuthResponse(authresp, endpoint)
+            success_result = resp.get_success_result()
+            summary = resp.get_summary()
+            if on_response is not None:
+                on_response(resp)
+            logging.info("Success : %s Summary : %s", success_result, summary)
+            if (success_result == True and summary != "OobPending"):
+                break
+            if (success_result != True):
+                break
+            if not scheduler.wait(resp.get_retry_after()):
+                scheduler.log_stats("OOB polling timed out.")
+                print()
+                print(Fore.RED + "Timed out waiting for the authentication to complete.. Exiting..")
+                print(Style.RESET_ALL)
+                sys.exit(0)
+    scheduler.log_stats("OOB polling done.")
+    return authresp, success_result, summary
 
 def handle_unix(mechanism, tenant_response, username, endpoint, method, environment, proxy, request, json_req):
+    from colorama import Fore, Style
     certpath = environment.get_certpath()
     mechanism_id = mechanism['MechanismId']
     session_id = tenant_response.get_sessionid()
@@ -117,70 +202,55 @@ def handle_unix(mechanism, tenant_response, username, endpoint, method, environm
     if (mechanism['Name'] == 'OATH'):
         choice = '1'
     if (choice == '1'):
-        passwd = getpass(mechanism['PromptSelectMech'] + " : ")
+        passwd = prompt(mechanism['PromptSelectMech'] + " : ", secret=True)
         request = AdvAuthRequest(tenant_id, session_id, mechanism_id, passwd)
         json_req = request.get_adv_auth_json_passwd()
-        authresp = call_rest_post(endpoint, method, json_req, headers, certpath, proxy, environment.get_debug())
+        with timings.span('advance_authentication', mechanism=mechanism['Name']):
+            authresp = call_rest_post(endpoint, method, json_req, headers, certpath, proxy, environment.get_debug())
         authresponse = AuthResponse(authresp, endpoint)
         success_result = authresponse.get_success_result()
         summary = authresponse.get_summary()
         if (success_result == False):
-            print(Fore.RED + 'Wrong Credentials.. Exiting..')
+            print(Fore.RED + get_prompt_label() + 'Wrong Credentials.. Exiting..')
             print(Style.RESET_ALL)
             sys.exit(0)
     else:
-        print("Waiting for completing authentication mechanism.. ")
+        print(get_prompt_label() + "Waiting for completing authentication mechanism.. ")
         json_req = request.get_adv_auth_json_poll()
-        number_shown = False
-        while (True):
-            authresp = call_rest_post(endpoint, method, json_req, headers, certpath, proxy, environment.get_debug())
-            resp = AuthResponse(authresp, endpoint)
-            success_result = resp.get_success_result()
-            summary = resp.get_summary()
-            if not number_shown:
-                try:
-                    json_data = json.loads(authresp.text)
-                    generated_value = json_data.get('Result', {}).get('GeneratedAuthValue')
-                    if generated_value:
-                        print(Fore.CYAN + "\n>>> Match this number on your mobile app: " + Fore.YELLOW + str(generated_value) + Style.RESET_ALL + "\n")
-                        number_shown = True
-                except Exception:
-                    pass
-            logging.info("Success : " + str(success_result) + " Summary : " + summary)
-            if (success_result == True and summary != "OobPending"):
-                break
-            if (success_result != True):
-                break
-    result.append(authresp)
-    result.append(success_result)
-    result.append(summary)
-        
+        shown = []
+        def show_number(resp):
+            generated_value = resp.get_generated_auth_value()
+            if generated_value and not shown:
+                print(Fore.CYAN + "\n>>> " + get_prompt_label() + "Match this number on your mobile app: " + Fore.YELLOW + str(generated_value) + Style.RESET_ALL + "\n")
+                shown.append(generated_value)
+        authresp, success_result, summary = poll_authentication(endpoint, method, json_req, headers, proxy, environment, show_number)
+    return authresp, success_result, summary
+
 
 def handle_text(mechanism, tenant_response, username, endpoint, method, proxy, environment):
     certpath = environment.get_certpath()
     mechanism_id = mechanism['MechanismId']
     session_id = tenant_response.get_sessionid()
     tenant_id = tenant_response.get_tenantid()
-    passwd = getpass(mechanism['PromptSelectMech'] + " : ")
+    passwd = prompt(mechanism['PromptSelectMech'] + " : ", secret=True)
     request = AdvAuthRequest(tenant_id, session_id, mechanism_id, passwd)
     json_req = request.get_adv_auth_json_passwd()
     headers = {}
-    authresp = call_rest_post(endpoint, method, json_req, headers, certpath, proxy, environment.get_debug())
+    with timings.span('advance_authentication', mechanism=mechanism['Name']):
+        authresp = call_rest_post(endpoint, method, json_req, headers, certpath, proxy, environment.get_debug())
     authresponse = AuthResponse(authresp, endpoint)
     success_result = authresponse.get_success_result()
-    logging.info("Is it Successful : " + str(success_result))
+    logging.info("Is it Successful : %s", success_result)
     summary = authresponse.get_summary()
-    logging.info(summary)
+    logging.info("%s", summary)
     if (success_result == False):
-        print("Wrong Credentials.. Exiting..")
+        print(get_prompt_label() + "Wrong Credentials.. Exiting..")
         sys.exit()
-    global result
-    result.append(authresp)
-    result.append(success_result)
-    result.append(summary)
+    return authresp, success_result, summary
 
             
 def handle_text_oob(mechanism, tenant_response, username, endpoint, method, proxy, environment):
+    from colorama import Fore, Style
     certpath = environment.get_certpath()
     mechanism_id = mechanism['MechanismId']
     session_id = tenant_response.get_sessionid()
@@ -189,62 +259,49 @@ def handle_text_oob(mechanism, tenant_response, username, endpoint, method, prox
     request = AdvAuthRequest(tenant_id, session_id, mechanism_id, "")
     json_req = request.get_adv_auth_json_startoob()
     headers = {}
-    authresp = call_rest_post(endpoint, method, json_req, headers, certpath, proxy, environment.get_debug())
-    logging.info("The response is StartOob req" + authresp.text)
+    with timings.span('start_oob', mechanism=mechanism['Name']):
+        authresp = call_rest_post(endpoint, method, json_req, headers, certpath, proxy, environment.get_debug())
+    logging.info("The response is StartOob req %s", lazy(get_text, authresp))
     try:
-        json_data = json.loads(authresp.text)
-        generated_value = json_data.get('Result', {}).get('GeneratedAuthValue')
+        generated_value = AuthResponse(authresp, endpoint).get_generated_auth_value()
         if generated_value:
-            print(Fore.CYAN + "\n>>> Match this number on your mobile app: " + Fore.YELLOW + str(generated_value) + Style.RESET_ALL + "\n")
+            print(Fore.CYAN + "\n>>> " + get_prompt_label() + "Match this number on your mobile app: " + Fore.YELLOW + str(generated_value) + Style.RESET_ALL + "\n")
     except Exception:
         pass
-    handle_unix(mechanism, tenant_response, username, endpoint, method, environment, proxy, request, json_req)
+    return handle_unix(mechanism, tenant_response, username, endpoint, method, environment, proxy, request, json_req)
 
 def advance_auth_for_mech(mechanism, tenant_response, username, endpoint, method, proxy, environment):
     certpath = environment.get_certpath()
     mechanism_id = mechanism['MechanismId']
     session_id = tenant_response.get_sessionid()
     tenant_id = tenant_response.get_tenantid()
-    logging.info("The AnswerType is : " + mechanism['AnswerType'])
+    logging.info("The AnswerType is : %s", mechanism['AnswerType'])
     if (mechanism['AnswerType'] == "Text" or mechanism['AnswerType'] == "StartTextOob"):
         if (mechanism['AnswerType'] == 'Text'):
-            handle_text(mechanism, tenant_response, username, endpoint, method, proxy, environment)
+            authresp, success_result, summary = handle_text(mechanism, tenant_response, username, endpoint, method, proxy, environment)
         if (mechanism['AnswerType'] == "StartTextOob"):
-            handle_text_oob(mechanism, tenant_response, username, endpoint, method, proxy, environment)
-        authresp = result[0]
-        success_result = result[1]
-        summary = result[2]
-        del result[:]
+            authresp, success_result, summary = handle_text_oob(mechanism, tenant_response, username, endpoint, method, proxy, environment)
         if (success_result == False):
             logging.info("Authentication is not successful..")
-            print("Authentication is not successful..")
+            print(get_prompt_label() + "Authentication is not successful..")
             sys.exit()
     elif (mechanism['AnswerType'] == "StartOob"):
         logging.info("StartOob..")
         request = AdvAuthRequest(tenant_id, session_id, mechanism_id, "")
         json_req = request.get_adv_auth_json_startoob()
         headers = {}
-        authresp = call_rest_post(endpoint, method, json_req, headers, certpath, proxy, environment.get_debug())
-        print(mechanism['PromptSelectMech'] + " Waiting ......")
-        json_req = request.get_adv_auth_json_poll()
-        while (True):
-            sys.stdout.write(".")
+        with timings.span('start_oob', mechanism=mechanism['Name']):
             authresp = call_rest_post(endpoint, method, json_req, headers, certpath, proxy, environment.get_debug())
-            resp = AuthResponse(authresp, endpoint)
-            success_result = resp.get_success_result()
-            summary = resp.get_summary()
-            if (success_result == True and summary != "OobPending"):
-                break
-            if (success_result != True):
-                break
-            time.sleep(2)
+        print(get_prompt_label() + mechanism['PromptSelectMech'] + " Waiting ......")
+        json_req = request.get_adv_auth_json_poll()
+        authresp, success_result, summary = poll_authentication(endpoint, method, json_req, headers, proxy, environment, lambda resp: sys.stdout.write("."))
         print()
-        logging.info("Is it Successful : " + str(success_result))
-        logging.info(summary)
+        logging.info("Is it Successful : %s", success_result)
+        logging.info("%s", summary)
     if (success_result == True and summary == "LoginSuccess"):
         session_token = authresp.cookies['.ASPXAUTH']
-        logging.info(session_token)
-        session = AuthSession(endpoint, username, session_id, session_token)
+        logging.info("Session token received")
+        session = AuthSession(endpoint, username, session_id, session_token, get_cookie_expiry(authresp.cookies, '.ASPXAUTH'))
         return session
     
 def elevate(session, appkey, headers, response, version, environment, proxy):
@@ -258,11 +315,53 @@ def elevate(session, appkey, headers, response, version, environment, proxy):
     message['elevate']=elav
     message['ChallengeStateId']=chal
     json_body=json.dumps(message)
-    chal_resp = call_rest_post(session.endpoint, method, json_body, headers, environment.get_certpath(), proxy, environment.get_debug())
+    with timings.span('elevate', appkey=appkey):
+        chal_resp = call_rest_post(session.endpoint, method, json_body, headers, environment.get_certpath(), proxy, environment.get_debug())
     auth_resp = AuthResponse(chal_resp, session.endpoint)
     return advance_authentication(auth_resp, session.endpoint, "", "1.0", proxy, environment)
         
+def get_cookie_expiry(cookies, name):
+    for cookie in cookies:
+        if getattr(cookie, 'name', None) == name:
+            return cookie.expires
+    return None
+
+def validate_session(session, proxy, environment):
+    method = "/Security/whoami"
+    headers = {}
+    headers['Authorization'] = "Bearer " + session.session_token
+    try:
+        with timings.span('validate_session'):
+            response = call_rest_post(session.endpoint, method, "{}", headers, environment.get_certpath(), proxy, environment.get_debug(), False)
+    except Exception as e:
+        # Falls back to a full login instead of ending the run
+        logging.info("Session validation failed : %s", e)
+        return False
+    if (response.status_code != 200):
+        logging.info("Session validation returned HTTP %d", response.status_code)
+        return False
+    try:
+        return response.json().get('success') == True
+    except ValueError:
+        return False
+
 def interactive_login(user, version, proxy, environment):
     response = start_authentication(user, version, proxy, environment)
     session = advance_authentication(response, response.tenant_url, user, version, proxy, environment)
     return session
+
+def cached_login(user, version, proxy, environment, use_cache=True):
+    tenant = environment.get_endpoint()
+    if use_cache:
+        session = sessioncache.load(tenant, user)
+        if session is not None:
+            if validate_session(session, proxy, environment):
+                logging.info("Reusing cached session for " + user)
+                print("Reusing the existing session for " + user)
+                return session
+            logging.info("Cached session for " + user + " was rejected")
+            sessioncache.remove(tenant, user)
+    session = interactive_login(user, version, proxy, environment)
+    if use_cache and session is not None:
+        sessioncache.save(tenant, user, session)
+    return session
@@ -17,61 +17,62 @@ import logging
 
 class AuthResponse(object):
     '''
-    Authentication Response received
+    Authentication Response received. The JSON body is decoded once and the
+    fields used by the login flow are kept in slots
     '''
+    __slots__ = ('response', 'tenant_url', 'success', 'result', 'summary', 'session_id', 'tenant_id', 'generated_auth_value', 'retry_after')
+
     def __init__(self, response, tenant_url):
         self.response = response
         self.tenant_url = tenant_url
         json_resp = json.loads(self.response.text)
-        logging.info('------ Json Response from the REST call ---------')
-        logging.info(json_resp)
-        logging.info('--------------------------------------------------')
-        
-                
+        logging.info('Json Response from the REST call : %s', json_resp)
+        self.success = json_resp['success']
+        result = json_resp.get('Result')
+        if not isinstance(result, dict):
+            result = {}
+        self.result = result
+        self.summary = result.get('Summary')
+        self.session_id = result.get('SessionId')
+        self.tenant_id = result.get('TenantId')
+        self.generated_auth_value = result.get('GeneratedAuthValue')
+        self.retry_after = None
+        headers = getattr(response, 'headers', None)
+        if headers and headers.get('Retry-After'):
+            try:
+                self.retry_after = float(headers.get('Retry-After'))
+            except ValueError:
+                logging.info("Ignoring Retry-After : %s", headers.get('Retry-After'))
+
     def get_success_result(self):
-        json_resp = json.loads(self.response.text)
-        success_result = json_resp['success']
-        return success_result
+        return self.success
 
     def get_tenant_url(self):
-        json_resp = json.loads(self.response.text)
-        tenant_url = json_resp['Result']['PodFqdn']
-        return tenant_url   
-    
+        return self.result['PodFqdn']
+
     def get_mechanism(self):
-        json_resp = json.loads(self.response.text)
-        challenges = json_resp['Result']['Challenges']
-        mechanisms = challenges[0]
-        a_mechanism = mechanisms['Mechanisms']
-        return a_mechanism
-    
+        return self.result['Challenges'][0]['Mechanisms']
+
     def get_challenges(self):
-        json_resp = json.loads(self.response.text)
-        return json_resp['Result']['Challenges']
+        return self.result['Challenges']
 
     def get_tenantid(self):
-        json_resp = json.loads(self.response.text)
-        tenant_id = json_resp['Result']['TenantId']
-        return tenant_id
-    
+        return self.tenant_id
+
     def get_sessionid(self):
-        json_resp = json.loads(self.response.text)
-        session_id = json_resp['Result']['SessionId']
-        return session_id
-    
+        return self.session_id
+
     def get_mechanismid(self):
-        json_resp = json.loads(self.response.text)
-        challenges = json_resp['Result']['Challenges']
-        mechanisms = challenges[0]
-        a_mechanism = mechanisms['Mechanisms']
-        mechanismid = a_mechanism[0]['MechanismId']
-        return mechanismid
+        return self.get_mechanism()[0]['MechanismId']
 
     def get_summary(self):
-        json_resp = json.loads(self.response.text)
-        return json_resp['Result']['Summary']
-    
+        return self.summary
+
     def get_message(self):
-        json_resp = json.loads(self.response.text)
-        return json_resp['Result']['Message']
-        
\ No newline at end of file
+        return self.result['Message']
+
+    def get_generated_auth_value(self):
+        return self.generated_auth_value
+
+    def get_retry_after(self):
+        return self.retry_after
@@ -17,9 +17,9 @@ class AuthSession(object):
     Authentication Result, which will store session id and session token (i.e. aspxauth cookie value)
     '''
 
-    def __init__(self, endpoint, username, session_id, session_token):
+    def __init__(self, endpoint, username, session_id, session_token, expires=None):
         self.endpoint = endpoint
         self.username = username
         self.session_id = session_id
         self.session_token = session_token
-        
\ No newline at end of file
+        self.expires = expires
@@ -29,7 +29,6 @@ class HtmlResponse(object):
         htmlparser.feed(self.html_response)
         saml = htmlparser.get_saml()
         htmlparser.clean()
-        logging.info("------------ SAML ---------------")
-        logging.info(saml)
+        logging.info("SAML : %s", saml)
         return saml
         
\ No newline at end of file
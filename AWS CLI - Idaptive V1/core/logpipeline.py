@@ -0,0 +1,179 @@
+# Copyright 2019 CyberArk, LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+
+import logging
+import logging.handlers
+import os
+import queue
+import re
+
+LOG_FORMAT = '%(asctime)s %(filename)s %(funcName)s %(lineno)d %(message)s'
+# Longest message written as is; anything over keeps its head and a marker
+MAX_MESSAGE = 4096
+MAX_BYTES = 5 * 1024 * 1024
+BACKUP_COUNT = 3
+# Records waiting for the writer thread; when it falls this far behind new
+# records are dropped (and counted) instead of blocking the caller
+MAX_QUEUED = 10000
+
+REDACTED = '***'
+REDACTIONS = [
+    (re.compile(r'<(\w+:)?Assertion\b.*?</(\w+:)?Assertion>', re.DOTALL), '[SAML assertion ' + REDACTED + ']'),
+    (re.compile(r'<(\w+:)?Assertion\b.*', re.DOTALL), '[SAML assertion ' + REDACTED + ']'),
+    (re.compile(r'(Bearer\s+)[^\s\'",}]+', re.IGNORECASE), r'\1' + REDACTED),
+    (re.compile(r'(\.ASPXAUTH=)[^;\s\'",}]+', re.IGNORECASE), r'\1' + REDACTED),
+    (re.compile(r'([\'"](?:Auth|Authorization|Password|Answer|SessionToken|SecretAccessKey|session_token|saml|SAMLAssertion)[\'"]\s*:\s*[\'"])[^\'"]*', re.IGNORECASE), r'\1' + REDACTED),
+    (re.compile(r'((?:SAMLAssertion|SessionToken|SecretAccessKey)=)[^&\s\'"]+'), r'\1' + REDACTED),
+    (re.compile(r'[A-Za-z0-9+/]{200,}={0,2}'), REDACTED)
+]
+
+
+class Lazy(object):
+    '''
+    Defers an expensive log argument (such as response.text) until the writer
+    thread formats the record
+    '''
+    __slots__ = ('func', 'args')
+
+    def __init__(self, func, *args):
+        self.func = func
+        self.args = args
+
+    def __str__(self):
+        return str(self.func(*self.args))
+
+
+def lazy(func, *args):
+    return Lazy(func, *args)
+
+def snapshot(value):
+    if isinstance(value, (dict, list, set)):
+        return type(value)(value)
+    return value
+
+def redact(message):
+    for pattern, replacement in REDACTIONS:
+        message = pattern.sub(replacement, message)
+    return message
+
+def truncate(message, limit=MAX_MESSAGE, length=None):
+    length = len(message) if length is None else length
+    if limit and length > limit:
+        return message[:limit] + ' ... [truncated, ' + str(length) + ' chars]'
+    return message
+
+
+class PayloadFilter(logging.Filter):
+    '''
+    Redacts secrets from the formatted message and caps its size. Runs on
+    the writer thread, after the record has left the caller
+    '''
+    def __init__(self, max_message=MAX_MESSAGE):
+        super().__init__()
+        self.max_message = max_message
+
+    def filter(self, record):
+        try:
+            message = record.getMessage()
+        except Exception as e:
+            # Bad format args or a failing Lazy must not kill the writer
+            # thread; keep what the caller passed instead
+            message = str(record.msg) + ' ' + repr(record.args) + ' [could not format: ' + repr(e) + ']'
+        length = len(message)
+        if self.max_message and length > 2 * self.max_message:
+            # Only the kept head needs redacting; the margin lets a secret
+            # straddling the cut still match its pattern
+            message = message[:2 * self.max_message]
+        record.msg = truncate(redact(message), self.max_message, length)
+        record.args = None
+        return True
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    '''
+    QueueHandler that leaves only Lazy arguments for the writer thread to
+    render, and drops records instead of blocking when the queue is full
+    '''
+    def __init__(self, log_queue, max_queued=MAX_QUEUED):
+        super().__init__(log_queue)
+        self.max_queued = max_queued
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Callers may change an argument (a headers dict, say) right after
+        # logging it, so everything but Lazy is formatted or copied now;
+        # redaction and truncation still happen on the writer thread
+        args = record.args
+        if not args:
+            return record
+        values = args.values() if isinstance(args, dict) else args
+        if not any(isinstance(value, Lazy) for value in values):
+            try:
+                record.msg = record.getMessage()
+                record.args = None
+            except Exception:
+                # Left to PayloadFilter, which logs what it can
+                pass
+        elif isinstance(args, tuple):
+            record.args = tuple(snapshot(value) for value in args)
+        return record
+
+    def enqueue(self, record):
+        if self.queue.qsize() >= self.max_queued:
+            self.dropped += 1
+            return
+        self.queue.put_nowait(record)
+
+
+_listener = None
+_handler = None
+
+
+def new_file_handler(logfile, max_bytes=MAX_BYTES, backups=BACKUP_COUNT):
+    handler = logging.handlers.RotatingFileHandler(logfile, 'a', max_bytes, backups, 'utf-8', delay=True)
+    # Each run starts a fresh log, the previous runs move to .1 .. .N
+    if backups and os.path.exists(logfile) and os.path.getsize(logfile) > 0:
+        handler.doRollover()
+    return handler
+
+def setup(logfile, level=logging.INFO, max_bytes=MAX_BYTES, backups=BACKUP_COUNT, max_message=MAX_MESSAGE):
+    global _listener, _handler
+    stop()
+    file_handler = new_file_handler(logfile, max_bytes, backups)
+    file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    file_handler.addFilter(PayloadFilter(max_message))
+    log_queue = queue.Queue()
+    _handler = DeferredQueueHandler(log_queue)
+    _listener = logging.handlers.QueueListener(log_queue, file_handler)
+    root = logging.getLogger()
+    root.addHandler(_handler)
+    root.setLevel(level)
+    _listener.start()
+    return _listener
+
+def stop():
+    global _listener, _handler
+    if _listener is None:
+        return
+    root = logging.getLogger()
+    root.removeHandler(_handler)
+    if _handler.dropped:
+        _handler.queue.put(logging.makeLogRecord({'msg': 'Dropped %d log records, the writer fell behind', 'args': (_handler.dropped,), 'levelno': logging.WARNING, 'levelname': 'WARNING'}))
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    _listener = None
+    _handler = None
@@ -0,0 +1,86 @@
+# Copyright 2019 CyberArk, LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+
+import json
+import logging
+import os
+import threading
+import time
+from core import util
+
+# The tenant to pod mapping rarely changes; a stale entry costs one failed
+# call before the vanity URL is asked again.
+DEFAULT_POD_TTL = 7 * 24 * 3600
+CACHE_FILE = 'pods.json'
+
+_lock = threading.Lock()
+_ttl = DEFAULT_POD_TTL
+
+
+def configure(ttl=DEFAULT_POD_TTL):
+    global _ttl
+    _ttl = ttl
+
+
+def get_cache_key(tenant):
+    return tenant.lower().rstrip('/')
+
+
+def get_cache_file():
+    return os.path.join(util.get_cache_dir(), CACHE_FILE)
+
+
+def read_cache():
+    try:
+        with open(get_cache_file(), 'r') as cache_file:
+            return json.load(cache_file)
+    except (IOError, ValueError):
+        return {}
+
+
+def write_cache(entries):
+    util.write_private_file(get_cache_file(), json.dumps(entries, indent=1))
+
+
+def load(tenant):
+    if _ttl <= 0:
+        return None
+    entry = read_cache().get(get_cache_key(tenant))
+    if entry is None:
+        return None
+    if entry.get('expires', 0) <= time.time():
+        logging.info("Cached pod for %s has expired", tenant)
+        return None
+    return entry['pod']
+
+
+def save(tenant, pod):
+    if _ttl <= 0:
+        return
+    with _lock:
+        entries = read_cache()
+        now = time.time()
+        entries = dict((key, value) for key, value in entries.items() if value.get('expires', 0) > now)
+        entries[get_cache_key(tenant)] = {'pod': pod, 'expires': now + _ttl}
+        write_cache(entries)
+    logging.info("Cached pod %s for %s", pod, tenant)
+
+
+def remove(tenant):
+    with _lock:
+        entries = read_cache()
+        if entries.pop(get_cache_key(tenant), None) is not None:
+            write_cache(entries)
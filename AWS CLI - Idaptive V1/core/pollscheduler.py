@@ -0,0 +1,84 @@
+# Copyright 2019 CyberArk, LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import logging
+import random
+import time
+
+DEFAULT_INITIAL_INTERVAL = 0.5
+DEFAULT_BACKOFF_FACTOR = 1.5
+DEFAULT_MAX_INTERVAL = 5.0
+DEFAULT_JITTER = 0.2
+DEFAULT_DEADLINE = 300
+
+
+class PollScheduler(object):
+    '''
+    Paces OOB polling of AdvanceAuthentication. Polls quickly at first, then
+    backs off exponentially with jitter, honors a server retry hint and gives
+    up once the overall deadline has passed
+    '''
+    def __init__(self, deadline=DEFAULT_DEADLINE, initial=DEFAULT_INITIAL_INTERVAL, factor=DEFAULT_BACKOFF_FACTOR,
+                 maximum=DEFAULT_MAX_INTERVAL, jitter=DEFAULT_JITTER, sleep=time.sleep, clock=time.monotonic):
+        self.deadline = deadline
+        self.initial = initial
+        self.factor = factor
+        self.maximum = maximum
+        self.jitter = jitter
+        self.sleep = sleep
+        self.clock = clock
+        self.interval = initial
+        self.started = clock()
+        self.polls = 0
+        self.waited = 0.0
+
+    def record_poll(self):
+        self.polls = self.polls + 1
+
+    def remaining(self):
+        if not self.deadline:
+            return None
+        return self.deadline - (self.clock() - self.started)
+
+    def expired(self):
+        remaining = self.remaining()
+        return remaining is not None and remaining <= 0
+
+    def next_delay(self, retry_after=None):
+        if retry_after is not None and retry_after > 0:
+            delay = retry_after
+        else:
+            delay = self.interval
+            delay = delay + random.uniform(-self.jitter, self.jitter) * delay
+            self.interval = min(self.interval * self.factor, self.maximum)
+        remaining = self.remaining()
+        if remaining is not None:
+            delay = min(delay, remaining)
+        return max(delay, 0)
+
+    def wait(self, retry_after=None):
+        if self.expired():
+            return False
+        delay = self.next_delay(retry_after)
+        self.sleep(delay)
+        self.waited = self.waited + delay
+        return not self.expired()
+
+    def get_stats(self):
+        return {'polls': self.polls, 'waited': round(self.waited, 3), 'elapsed': round(self.clock() - self.started, 3)}
+
+    def log_stats(self, label):
+        stats = self.get_stats()
+        logging.info(label + " polls : " + str(stats['polls']) + " waited : " + str(stats['waited']) + "s elapsed : " + str(stats['elapsed']) + "s")
@@ -0,0 +1,168 @@
+# Copyright 2019 CyberArk, LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+
+# Decides per endpoint whether a call goes direct or through a proxy.
+# proxy.properties wins when it turns the proxy on; otherwise the usual
+# HTTP_PROXY / HTTPS_PROXY / NO_PROXY environment variables apply. Proxy
+# credentials are carried in the proxy URL, which is where requests and
+# urllib3 look for them when they open (and then pool) the CONNECT tunnel.
+# Imported on the startup path, so it must not pull in requests.
+
+import logging
+import os
+import threading
+from urllib import parse as urlparse
+
+# Passing None for every scheme stops requests from filling the proxies back
+# in from the environment for a route decided to be direct
+DIRECT = {'http': None, 'https': None, 'all': None}
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def get_env(name):
+    return os.environ.get(name.lower()) or os.environ.get(name.upper()) or ''
+
+def add_credentials(proxy_url, user, password):
+    if not proxy_url:
+        return None
+    if '://' not in proxy_url:
+        proxy_url = 'http://' + proxy_url
+    parsed = urlparse.urlsplit(proxy_url)
+    if user and '@' not in parsed.netloc:
+        credentials = urlparse.quote(user, safe='')
+        if password:
+            credentials = credentials + ':' + urlparse.quote(password, safe='')
+        parsed = parsed._replace(netloc=credentials + '@' + parsed.netloc)
+    return urlparse.urlunsplit(parsed)
+
+def hide_credentials(proxy_url):
+    if not proxy_url:
+        return 'direct'
+    parsed = urlparse.urlsplit(proxy_url)
+    return parsed.scheme + '://' + parsed.netloc.rsplit('@', 1)[-1]
+
+def parse_no_proxy(value):
+    return [entry.strip().lower() for entry in value.replace(';', ',').split(',') if entry.strip()]
+
+
+class NoProxyRule(object):
+    '''
+    One NO_PROXY entry: *, a host or domain suffix (optionally with a port),
+    or an IP network such as 10.0.0.0/8
+    '''
+    def __init__(self, entry):
+        self.entry = entry
+        self.network = None
+        self.port = None
+        host = entry
+        if '/' in entry:
+            import ipaddress
+            try:
+                self.network = ipaddress.ip_network(entry, strict=False)
+            except ValueError:
+                pass
+        elif entry.count(':') == 1:
+            host, port = entry.rsplit(':', 1)
+            if port.isdigit():
+                self.port = int(port)
+            else:
+                host = entry
+        self.host = host.lstrip('*').lstrip('.')
+
+    def matches(self, host, port):
+        if self.entry == '*':
+            return True
+        if self.network is not None:
+            import ipaddress
+            try:
+                return ipaddress.ip_address(host) in self.network
+            except ValueError:
+                return False
+        if self.port is not None and self.port != port:
+            return False
+        return host == self.host or host.endswith('.' + self.host)
+
+
+class ProxyRouter(object):
+    '''
+    Maps an endpoint to the proxies dict for requests, caching the decision
+    per scheme://host:port
+    '''
+    def __init__(self, http_proxy=None, https_proxy=None, no_proxy='', source='none'):
+        self.proxies = {'http': http_proxy, 'https': https_proxy}
+        self.rules = [NoProxyRule(entry) for entry in parse_no_proxy(no_proxy)]
+        self.source = source
+        self.routes = {}
+        self.lock = threading.Lock()
+
+    def is_enabled(self):
+        return bool(self.proxies['http'] or self.proxies['https'])
+
+    def is_bypassed(self, host, port):
+        for rule in self.rules:
+            if rule.matches(host, port):
+                return True
+        return False
+
+    def get_route(self, url):
+        parsed = urlparse.urlsplit(url)
+        scheme = parsed.scheme.lower()
+        host = (parsed.hostname or '').lower()
+        port = parsed.port or DEFAULT_PORTS.get(scheme)
+        key = scheme + '://' + host + ':' + str(port)
+        with self.lock:
+            route = self.routes.get(key)
+        if route is not None:
+            return route
+        proxy_url = self.proxies.get(scheme)
+        if proxy_url and self.is_bypassed(host, port):
+            proxy_url = None
+        route = proxy_url
+        logging.info("Route for %s : %s (%s)", key, hide_credentials(route), self.source)
+        with self.lock:
+            self.routes[key] = route
+        return route
+
+    def get_proxies(self, url):
+        route = self.get_route(url)
+        if route is None:
+            return dict(DIRECT)
+        return {'http': route, 'https': route}
+
+    def describe(self, url):
+        return hide_credentials(self.get_route(url))
+
+
+def from_config(proxy_obj):
+    if proxy_obj is not None and proxy_obj.is_proxy() == 'yes':
+        user = proxy_obj.get_user()
+        password = proxy_obj.get_password()
+        return ProxyRouter(add_credentials(proxy_obj.get_http(), user, password),
+                           add_credentials(proxy_obj.get_https(), user, password),
+                           proxy_obj.get_no_proxy() or get_env('no_proxy'), 'proxy.properties')
+    http_proxy = get_env('http_proxy')
+    https_proxy = get_env('https_proxy')
+    if http_proxy or https_proxy:
+        return ProxyRouter(add_credentials(http_proxy, None, None), add_credentials(https_proxy, None, None), get_env('no_proxy'), 'environment')
+    return ProxyRouter()
+
+def get_proxies(proxy, url):
+    # proxy is a ProxyRouter, or a plain requests proxies dict from older callers
+    if proxy is None:
+        return None
+    if isinstance(proxy, ProxyRouter):
+        return proxy.get_proxies(url)
+    return proxy
@@ -12,12 +12,12 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import requests
 import logging
 import sys, traceback, trace
-from colorama import Fore, Back, Style
+from core import transport, timings
+from core.logpipeline import lazy
     
-def call_rest_post(endpoint, method, body, headers, certpath, proxy, debug):
+def call_rest_post(endpoint, method, body, headers, certpath, proxy, debug, exit_on_error=True, stream=False):
     endpoint = endpoint+method
     if 'x-centrify-native-client' not in headers:
         headers['x-centrify-native-client'] = "true"
@@ -28,21 +28,33 @@ def call_rest_post(endpoint, method, body, headers, certpath, proxy, debug):
 
     headers['User-Agent'] = "CyberArkIdentity-AWS-Cli"
 
-    logging.info("Calling " + endpoint + " with headers : " + str(headers))
+    logging.info("Calling %s with headers : %s", endpoint, headers)
     if (debug):
-        logging.info("Request : " + str(body))
+        logging.info("Request : %s", body)
     
-    try :
-        response = requests.post(endpoint, headers=headers, verify=certpath, proxies=proxy, data=body)
-    except Exception as e :
-        logging.exception('Error in calling ' + endpoint + ' - ')
-        print(Fore.RED + 'Error in calling ' + endpoint + ' - Please refer logs. ')
-        print(Style.RESET_ALL)
-        sys.exit(0)
+    with timings.span(timings.HTTP_SPAN, path=method) as span:
+        try :
+            response = transport.get_transport().post(endpoint, headers=headers, verify=certpath, proxies=proxy, data=body, stream=stream)
+        except Exception as e :
+            if not exit_on_error:
+                logging.info("Error in calling %s : %s", endpoint, e)
+                raise
+            from colorama import Fore, Style
+            logging.exception('Error in calling ' + endpoint + ' - ')
+            print(Fore.RED + 'Error in calling ' + endpoint + ' - Please refer logs. ')
+            print(Style.RESET_ALL)
+            sys.exit(0)
+        span.set_response(response, count_body=not stream)
     
-    logging.info("Received Response : " + response.text)
+    if stream:
+        logging.info("Receiving streamed response, HTTP %d", response.status_code)
+    else:
+        logging.info("Received Response : %s", lazy(get_text, response))
     return response
 
+def get_text(response):
+    return response.text
+
 #Following method is not used currently. It will be used if redirects are needed.
 def call_rest_post_redirect(endpoint, method, body, headers, certpath, proxy, allow_redirects=True):
     if 'x-centrify-native-client' not in headers:
@@ -52,10 +64,9 @@ def call_rest_post_redirect(endpoint, method, body, headers, certpath, proxy, al
     if 'cache-control' not in headers:
         headers['cache-control'] = "no-cache"
     endpoint = endpoint+method
-    logging.info("Calling " + endpoint)
-    logging.info("Method : " + method + " Request Body : " + str(body) + " Headers : " + str(headers) + " Proxy : " + str(proxy))
-    logging.info("Calling " + endpoint + " with headers : " + str(headers) + " and data : " + str(body))
-    response = requests.post(endpoint, headers=headers, verify=certpath, proxies=proxy, data=body)
-    logging.info("Received Response : " + response.text)
+    logging.info("Calling %s", endpoint)
+    logging.info("Method : %s Request Body : %s Headers : %s Proxy : %s", method, body, headers, proxy)
+    response = transport.get_transport().post(endpoint, headers=headers, verify=certpath, proxies=proxy, data=body)
+    logging.info("Received Response : %s", lazy(get_text, response))
     return response
     
\ No newline at end of file
@@ -0,0 +1,193 @@
+# Copyright 2019 CyberArk, LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+
+# The roles of a SAML assertion, indexed by ARN, account ID, role name, path
+# and SAML provider. Selectors such as 'Admin*', '123456789012/ReadOnly',
+# 'prod-*/Admin*' or 're:...' are answered from the indexes: exact values by
+# dict lookup, prefixes and globs by bisecting the sorted keys of an index,
+# so a lookup does not walk every role.
+
+import bisect
+import fnmatch
+import re
+import threading
+from core import samlassertion
+
+PATTERN_CHARS = '*?['
+REGEX_PREFIX = 're:'
+ARN_PREFIX = 'arn:'
+ACCOUNT_PATTERN = re.compile(r'^\d{12}$')
+# Catalogs kept per assertion, as for the parsed assertions themselves
+MAX_CATALOGS = samlassertion.MAX_PARSED
+
+
+class RoleEntry(object):
+    '''
+    One role of the assertion, split into the parts it can be selected by
+    '''
+    __slots__ = ('arn', 'provider', 'account', 'path', 'name', 'provider_name')
+
+    def __init__(self, arn, provider):
+        self.arn = arn
+        self.provider = provider
+        self.account, self.path, self.name = split_role_arn(arn)
+        self.provider_name = provider.rsplit('/', 1)[-1]
+
+    def get_label(self):
+        return self.path + self.name
+
+
+def split_role_arn(arn):
+    # arn:aws:iam::123456789012:role/some/path/Name -> account, '/some/path/', 'Name'
+    fields = arn.split(':', 5)
+    account = fields[4] if len(fields) > 5 else ''
+    resource = fields[5] if len(fields) > 5 else arn
+    if resource.startswith('role/'):
+        resource = resource[len('role/'):]
+    path, slash, name = resource.rpartition('/')
+    return account, '/' + path + '/' if path else '/', name
+
+
+class Index(object):
+    '''
+    Entries by a lowercase key, with the keys kept sorted for prefix and glob
+    lookups
+    '''
+    def __init__(self):
+        self.entries = {}
+        self.keys = []
+
+    def add(self, key, entry):
+        self.entries.setdefault(key.lower(), []).append(entry)
+
+    def freeze(self):
+        self.keys = sorted(self.entries)
+
+    def get_range(self, prefix):
+        start = bisect.bisect_left(self.keys, prefix)
+        end = bisect.bisect_left(self.keys, prefix + '\uffff')
+        return self.keys[start:end]
+
+    def match(self, pattern):
+        pattern = pattern.lower()
+        if pattern.startswith(REGEX_PREFIX):
+            # No index helps a regular expression; it is tried on each
+            # distinct key rather than each role
+            regex = re.compile(pattern[len(REGEX_PREFIX):], re.IGNORECASE)
+            keys = [key for key in self.keys if regex.search(key)]
+        elif not any(char in pattern for char in PATTERN_CHARS):
+            keys = [pattern] if pattern in self.entries else []
+        else:
+            literal = len(pattern)
+            for char in PATTERN_CHARS:
+                if char in pattern:
+                    literal = min(literal, pattern.index(char))
+            keys = self.get_range(pattern[:literal])
+            if (pattern[literal:] != '*'):
+                keys = [key for key in keys if fnmatch.fnmatchcase(key, pattern)]
+        matched = []
+        for key in keys:
+            matched.extend(self.entries[key])
+        return matched
+
+
+class RoleCatalog(object):
+    '''
+    The roles of one assertion, indexed for selection and grouped by account
+    '''
+    def __init__(self, roles):
+        self.entries = [RoleEntry(role, provider) for role, provider in roles]
+        self.by_arn = Index()
+        self.by_account = Index()
+        self.by_name = Index()
+        self.by_path = Index()
+        self.by_provider = Index()
+        for entry in self.entries:
+            self.by_arn.add(entry.arn, entry)
+            self.by_account.add(entry.account, entry)
+            self.by_name.add(entry.name, entry)
+            self.by_path.add(entry.path.strip('/'), entry)
+            self.by_provider.add(entry.provider_name, entry)
+        for index in (self.by_arn, self.by_account, self.by_name, self.by_path, self.by_provider):
+            index.freeze()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, arn):
+        entries = self.by_arn.entries.get(arn.lower())
+        return entries[0] if entries else None
+
+    def get_grouped(self, entries=None):
+        # [(account, [entries])] by account, roles by path and name
+        groups = {}
+        for entry in (self.entries if entries is None else entries):
+            groups.setdefault(entry.account, []).append(entry)
+        return [(account, sorted(groups[account], key=lambda entry: entry.get_label().lower())) for account in sorted(groups)]
+
+    def find(self, selector):
+        selector = selector.strip()
+        if not selector:
+            return []
+        if selector.lower().startswith(ARN_PREFIX):
+            return self.by_arn.match(selector)
+        if selector.lower().startswith(REGEX_PREFIX):
+            return self.by_arn.match(selector)
+        if '/' in selector:
+            # <account, path or provider>/<role name>
+            scope, name = selector.rsplit('/', 1)
+            names = self.by_name.match(name or '*')
+            if not names:
+                return []
+            scoped = set()
+            for index in (self.by_account, self.by_path, self.by_provider):
+                scoped.update(id(entry) for entry in index.match(scope.strip('/')))
+            return [entry for entry in names if id(entry) in scoped]
+        if ACCOUNT_PATTERN.match(selector):
+            return self.by_account.match(selector)
+        return self.by_name.match(selector)
+
+    def select(self, selectors, entries=None):
+        # Roles matching any of the selectors, in catalog order, limited to
+        # entries when given
+        allowed = None if entries is None else set(id(entry) for entry in entries)
+        chosen = set()
+        missing = []
+        for selector in selectors:
+            found = [entry for entry in self.find(selector) if allowed is None or id(entry) in allowed]
+            if not found:
+                missing.append(selector)
+            chosen.update(id(entry) for entry in found)
+        return [entry for entry in self.entries if id(entry) in chosen], missing
+
+
+def split_selectors(value):
+    return [selector.strip() for selector in value.split(',') if selector.strip()]
+
+
+_catalogs = {}
+_catalogs_lock = threading.Lock()
+
+
+def get_catalog(encoded_saml):
+    attributes = samlassertion.parse_saml(encoded_saml)
+    with _catalogs_lock:
+        catalog = _catalogs.get(attributes.digest)
+        if catalog is None:
+            if len(_catalogs) >= MAX_CATALOGS:
+                _catalogs.pop(next(iter(_catalogs)))
+            catalog = _catalogs[attributes.digest] = RoleCatalog(attributes.roles)
+        return catalog
@@ -15,28 +15,34 @@
 from core import restclient, auth
 from core.htmlresponse import HtmlResponse
 import base64
-import xml.etree.ElementTree as ET
 import sys
 from core.awsinputs import AwsInputs
 from core.util import printline
 import logging
+import re
 from _operator import contains
 import urllib
 from urllib import parse as urlparse
 import json
+from core.samlassertion import get_roles, get_saml_expiry, parse_saml
+from core import rolecatalog, samlcache, timings
 from core.authresponse import AuthResponse
-from colorama import Fore, Style
 
 
-def handle_app_click(session, appkey, version, environment, proxy):
+def handle_app_click(session, appkey, version, environment, proxy, interactive=True):
     method = "/uprest/handleAppClick?appkey=" + appkey
     body = {}
     headers = {}
     session_token = "Bearer "+session.session_token
     headers['Authorization'] = session_token
-    response = restclient.call_rest_post(session.endpoint, method, body, headers, environment.get_certpath(), proxy, environment.get_debug())
-    logging.info("Call App Response URL : " + response.url)
+    with timings.span('handle_app_click', appkey=appkey):
+        response = restclient.call_rest_post(session.endpoint, method, body, headers, environment.get_certpath(), proxy, environment.get_debug())
+    logging.info("Call App Response URL : %s", response.url)
     if ('elevate' in response.url):
+        if not interactive:
+            # Elevation prompts for MFA; only the foreground flow may do that
+            logging.info("App %s needs elevation, not clicked in the background", appkey)
+            return None
         url = response.url
         parsed_url = urlparse.urlparse(url)
         elav = urlparse.parse_qs(parsed_url.query)['elevate'][0]
@@ -47,76 +53,110 @@ def handle_app_click(session, appkey, version, environment, proxy):
         headers['X-CFY-CHALLENGEID'] = chal
         body['ChallengeStateId'] = chal
         json_body = json.dumps(body)
-        response = restclient.call_rest_post(session.endpoint, method, json_body, headers, environment.get_certpath(), proxy, environment.get_debug())
-        logging.info("Call App Response URL - After Elevate : " + response.url)
+        with timings.span('handle_app_click', appkey=appkey, elevated=True):
+            response = restclient.call_rest_post(session.endpoint, method, json_body, headers, environment.get_certpath(), proxy, environment.get_debug())
+        logging.info("Call App Response URL - After Elevate : %s", response.url)
     return response
 
-def call_app(session, appkey, version, environment, proxy):
-    response = handle_app_click(session, appkey, version, environment, proxy)
+def call_app(session, appkey, version, environment, proxy, interactive=True):
+    cache = samlcache.get_cache()
+    encoded_saml = cache.get(environment.get_endpoint(), session.username, appkey)
+    if encoded_saml is not None:
+        logging.info("Using cached SAML assertion for %s", appkey)
+        return encoded_saml
+    response = handle_app_click(session, appkey, version, environment, proxy, interactive)
+    if response is None:
+        return None
     html_response = HtmlResponse(response.text)
-    logging.info("------------------- App Response ----------------")
-    logging.info(html_response)
+    logging.info("App Response : %s", html_response)
     encoded_saml = html_response.get_saml()
     if (encoded_saml == ''):
         logging.info('Did not receive SAML response. Please check if you have chosen Saml App')
         print('Did not receive SAML response. Please check if you have chosen Saml App')
         print('Exiting..')
         sys.exit()
+    cache.put(environment.get_endpoint(), session.username, appkey, encoded_saml)
     return encoded_saml
 
+def parse_numbers(inputstring):
+    # "3", "1,4" or "2-5 7" -> [3], [1, 4], [2, 3, 4, 5, 7]; None when the
+    # input is not a list of numbers
+    numbers = []
+    for token in inputstring.replace(',', ' ').split():
+        first, dash, last = token.partition('-')
+        if not (first.isdigit() and (not dash or last.isdigit())):
+            return None
+        numbers.extend(range(int(first), int(last if dash else first) + 1))
+    return numbers or None
+
+def print_roles(catalog, entries):
+    # Numbered by account; returns the entries in the order they are shown
+    from colorama import Fore, Style
+    shown = []
+    for account, group in catalog.get_grouped(entries):
+        print(Fore.CYAN + 'Account ' + account + ' - ' + str(len(group)) + ' role(s)' + Style.RESET_ALL)
+        for entry in group:
+            shown.append(entry)
+            print('[', len(shown), ']: ', entry.get_label(), ' (' + entry.arn + ')')
+    return shown
+
 def choose_role(encoded_saml, appkey):
-    logging.info("Decoding SAML ....")
-    decoded_saml = base64.b64decode(encoded_saml)
-    logging.info(decoded_saml)
-    root = ET.fromstring(decoded_saml)
-    awsroles = []
-    for saml2attribute in root.iter('{urn:oasis:names:tc:SAML:2.0:assertion}Attribute'):
-        if (saml2attribute.get('Name') == 'https://aws.amazon.com/SAML/Attributes/Role'):
-            for saml2attributevalue in saml2attribute.iter('{urn:oasis:names:tc:SAML:2.0:assertion}AttributeValue'):
-                awsroles.append(saml2attributevalue.text)
-    
-    allroles = []
-    saml_provider = []
-    for awsrole in awsroles:
-        chunks = awsrole.split(',')
-        allroles.append(chunks[0]) 
-        saml_provider.append(chunks[1])
+    from colorama import Fore, Style
+    saml_attributes = parse_saml(encoded_saml)
+    logging.info(saml_attributes)
+    catalog = rolecatalog.get_catalog(encoded_saml)
     
     printline()
     print(Fore.GREEN)
-    print("Select a role to login. Choose one role at a time. This")
-    print("selection might be displayed multiple times to facilitate")
+    print("Select the roles to login. Enter numbers (1,3-5), a role")
+    print("name or pattern (Admin*, 123456789012/ReadOnly, prod-*/Admin*,")
+    print("re:<regex>) to narrow the list, or 'a' for every role shown.")
+    print("This selection might be displayed multiple times to facilitate")
     print("multiple profile creations. ")
     print("Type 'q' to exit.")
     print(Style.RESET_ALL)
     print('Please choose the role you would like to assume -')
-    if (len(allroles) > 1):
-        i = 1
-        for role in allroles:
-            print('[',i,']: ', role)
-            i = i+1
-        try:
+    if (len(catalog) > 1):
+        view = catalog.entries
+        chosen = None
+        while chosen is None:
+            shown = print_roles(catalog, view)
             inputstring = ""
             while (inputstring == ""):
-                inputstring = input('Please select : ')
-            selection = int (inputstring)
-        except ValueError:
-            return 'q', None
-        if (selection > len(allroles)):
-            print('You have selected a wrong role..')
-            sys.exit(0)
+                inputstring = input('Please select : ').strip()
+            if (inputstring.lower() == 'q'):
+                return 'q', None
+            if (inputstring.lower() in ('a', 'all')):
+                chosen = shown
+                continue
+            numbers = parse_numbers(inputstring)
+            if numbers is not None:
+                if (min(numbers) < 1 or max(numbers) > len(shown)):
+                    print('You have selected a wrong role..')
+                    sys.exit(0)
+                chosen = [shown[number - 1] for number in numbers]
+                continue
+            try:
+                found, missing = catalog.select(rolecatalog.split_selectors(inputstring), view)
+            except re.error as e:
+                print('Not a valid regular expression : ' + str(e))
+                continue
+            if not found:
+                print('No role matches ' + inputstring)
+            elif (len(found) == 1):
+                chosen = found
+            else:
+                view = found
     else:
-        print('1: ' + allroles[0])
+        print('1: ' + catalog.entries[0].arn)
         print("Selecting above role. ")
-        selection = 1
+        chosen = catalog.entries
         
-    role = allroles[selection-1]
-    principle = saml_provider[selection-1]
-    
-    print('You Chose : ', role)
-    print('Your SAML Provider : ', principle)
+    for entry in chosen:
+        print('You Chose : ', entry.arn)
+        print('Your SAML Provider : ', entry.provider)
         
-    awsinputs = AwsInputs(role, principle, encoded_saml)
-    if (len(allroles) == 1):
+    awsinputs = [AwsInputs(entry.arn, entry.provider, encoded_saml) for entry in chosen]
+    if (len(catalog) == 1):
         return 'one_role_quit', awsinputs
-    return 'go', awsinputs
\ No newline at end of file
+    return 'go', awsinputs
@@ -0,0 +1,151 @@
+# Copyright 2019 CyberArk, LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+
+import base64
+import hashlib
+import io
+import threading
+from core import util
+from datetime import datetime, timezone
+
+SAML2_ASSERTION = '{urn:oasis:names:tc:SAML:2.0:assertion}'
+ATTRIBUTE = SAML2_ASSERTION + 'Attribute'
+ATTRIBUTE_VALUE = SAML2_ASSERTION + 'AttributeValue'
+ATTRIBUTE_STATEMENT = SAML2_ASSERTION + 'AttributeStatement'
+EXPIRY_TAGS = (SAML2_ASSERTION + 'Conditions', SAML2_ASSERTION + 'SubjectConfirmationData')
+
+ROLE_ATTRIBUTE = 'https://aws.amazon.com/SAML/Attributes/Role'
+SESSION_NAME_ATTRIBUTE = 'https://aws.amazon.com/SAML/Attributes/RoleSessionName'
+SESSION_DURATION_ATTRIBUTE = 'https://aws.amazon.com/SAML/Attributes/SessionDuration'
+WANTED_ATTRIBUTES = (ROLE_ATTRIBUTE, SESSION_NAME_ATTRIBUTE, SESSION_DURATION_ATTRIBUTE)
+
+# Parsed assertions kept per assertion; a run only ever sees a handful
+MAX_PARSED = 16
+
+
+class SamlAttributes(object):
+    '''
+    The parts of a SAML assertion the AWS flow needs: roles, session name,
+    session duration and the earliest NotOnOrAfter
+    '''
+    __slots__ = ('digest', 'size', 'roles', 'session_name', 'session_duration', 'expiry')
+
+    def __init__(self, digest, size):
+        self.digest = digest
+        self.size = size
+        self.roles = []
+        self.session_name = None
+        self.session_duration = None
+        self.expiry = None
+
+    def __str__(self):
+        return "SAML " + self.digest[:12] + " (" + str(self.size) + " bytes) roles : " + str(len(self.roles)) + " session name : " + str(self.session_name) + " session duration : " + str(self.session_duration) + " expires : " + str(self.expiry)
+
+
+_parsed = {}
+_parsed_lock = threading.Lock()
+
+
+def get_digest(encoded_saml):
+    if isinstance(encoded_saml, str):
+        encoded_saml = encoded_saml.encode('ascii')
+    return hashlib.sha256(encoded_saml).hexdigest()
+
+def decode_saml(encoded_saml):
+    import xml.etree.ElementTree as ET
+    decoded_saml = base64.b64decode(encoded_saml)
+    return ET.fromstring(decoded_saml)
+
+def read_attribute(values, name, attributes):
+    if (name == ROLE_ATTRIBUTE):
+        for value in values:
+            chunks = value.split(',')
+            attributes.roles.append((chunks[0].strip(), chunks[1].strip()))
+    elif (name == SESSION_NAME_ATTRIBUTE and values):
+        attributes.session_name = values[0]
+    elif (name == SESSION_DURATION_ATTRIBUTE and values):
+        try:
+            attributes.session_duration = int(values[0])
+        except ValueError:
+            pass
+
+def read_expiry(element, attributes):
+    not_on_or_after = element.get('NotOnOrAfter')
+    if not_on_or_after:
+        value = parse_saml_time(not_on_or_after)
+        if attributes.expiry is None or value < attributes.expiry:
+            attributes.expiry = value
+
+def parse_assertion(encoded_saml, digest):
+    # Single streaming pass: only the attributes listed above are collected,
+    # everything else is cleared as soon as it closes and parsing stops at the
+    # end of the AttributeStatement (the signature and conditions come first).
+    import xml.etree.ElementTree as ET
+    decoded_saml = base64.b64decode(encoded_saml)
+    attributes = SamlAttributes(digest, len(decoded_saml))
+    name = None
+    values = []
+    for event, element in ET.iterparse(io.BytesIO(decoded_saml), events=('start', 'end')):
+        tag = element.tag
+        if (event == 'start'):
+            if (tag == ATTRIBUTE):
+                name = element.get('Name')
+                if name not in WANTED_ATTRIBUTES:
+                    name = None
+                values = []
+            elif (tag in EXPIRY_TAGS):
+                read_expiry(element, attributes)
+            continue
+        if (tag == ATTRIBUTE_VALUE):
+            if name is not None and element.text:
+                values.append(element.text)
+        elif (tag == ATTRIBUTE):
+            if name is not None:
+                read_attribute(values, name, attributes)
+            name = None
+        elif (tag == ATTRIBUTE_STATEMENT):
+            break
+        element.clear()
+    return attributes
+
+def parse_saml(encoded_saml):
+    # Keyed on the assertion itself: str hashes are cached, so a repeat lookup
+    # for the same assertion does not rehash it. The digest identifies it in logs.
+    with _parsed_lock:
+        attributes = _parsed.get(encoded_saml)
+    if attributes is not None:
+        return attributes
+    attributes = parse_assertion(encoded_saml, get_digest(encoded_saml))
+    with _parsed_lock:
+        if len(_parsed) >= MAX_PARSED:
+            _parsed.pop(next(iter(_parsed)))
+        _parsed[encoded_saml] = attributes
+    return attributes
+
+def get_roles(encoded_saml):
+    return list(parse_saml(encoded_saml).roles)
+
+def get_saml_expiry(encoded_saml):
+    return parse_saml(encoded_saml).expiry
+
+def parse_saml_time(value):
+    return util.parse_iso_time(value)
+
+def seconds_until_expiry(encoded_saml):
+    expiry = get_saml_expiry(encoded_saml)
+    if expiry is None:
+        return None
+    return (expiry - datetime.now(timezone.utc)).total_seconds()
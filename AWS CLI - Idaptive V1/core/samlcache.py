@@ -0,0 +1,105 @@
+# Copyright 2019 CyberArk, LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from core import util
+from core.samlassertion import get_saml_expiry
+
+CACHE_FILE = 'saml.json'
+# An assertion this close to NotOnOrAfter is treated as expired so that the
+# STS call made with it still lands inside the validity window.
+EXPIRY_MARGIN = 30
+# Used when an assertion carries no NotOnOrAfter at all
+DEFAULT_TTL = 300
+
+
+class SamlCache(object):
+    '''
+    Encoded SAML assertions per tenant, user and app key, kept until their
+    NotOnOrAfter. Held in memory and, when enabled, in a private file
+    '''
+    def __init__(self):
+        self.entries = {}
+        self.persist = False
+        self.lock = threading.Lock()
+
+    def get_key(self, tenant, username, appkey):
+        raw = tenant.lower().rstrip('/') + '|' + username.lower() + '|' + appkey
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get_cache_file(self):
+        return os.path.join(util.get_cache_dir(), CACHE_FILE)
+
+    def read_file(self):
+        try:
+            with open(self.get_cache_file(), 'r') as cache_file:
+                return json.load(cache_file)
+        except (IOError, ValueError):
+            return {}
+
+    def write_file(self):
+        now = time.time()
+        entries = dict((key, value) for key, value in self.read_file().items() if value['expires'] > now)
+        entries.update((key, value) for key, value in self.entries.items() if value['expires'] > now)
+        util.write_private_file(self.get_cache_file(), json.dumps(entries))
+
+    def get(self, tenant, username, appkey):
+        key = self.get_key(tenant, username, appkey)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None and self.persist:
+                entry = self.read_file().get(key)
+                if entry is not None:
+                    self.entries[key] = entry
+            if entry is None:
+                return None
+            if entry['expires'] - EXPIRY_MARGIN <= time.time():
+                logging.info("Cached SAML assertion for " + appkey + " has expired")
+                del self.entries[key]
+                return None
+        return entry['saml']
+
+    def put(self, tenant, username, appkey, encoded_saml):
+        expiry = get_saml_expiry(encoded_saml)
+        if expiry is None:
+            expires = time.time() + DEFAULT_TTL
+        else:
+            expires = expiry.timestamp()
+        key = self.get_key(tenant, username, appkey)
+        with self.lock:
+            self.entries[key] = {'saml': encoded_saml, 'expires': expires}
+            if self.persist:
+                self.write_file()
+        logging.info("Cached SAML assertion for " + appkey + " until " + time.ctime(expires))
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+_cache = SamlCache()
+
+
+def get_cache():
+    return _cache
+
+
+def enable_persistence(persist=True):
+    _cache.persist = persist
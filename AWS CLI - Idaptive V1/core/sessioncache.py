@@ -0,0 +1,84 @@
+# Copyright 2019 CyberArk, LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+import json
+import logging
+import os
+import threading
+import time
+from core.authsession import AuthSession
+from core import util
+
+# Used when the .ASPXAUTH cookie carries no expiry of its own. A cached
+# session is always validated against the tenant before it is reused.
+DEFAULT_SESSION_TTL = 8 * 3600
+CACHE_FILE = 'sessions.json'
+
+_lock = threading.Lock()
+
+
+def get_cache_key(tenant, username):
+    return tenant.lower().rstrip('/') + '|' + username.lower()
+
+
+def get_cache_file():
+    return os.path.join(util.get_cache_dir(), CACHE_FILE)
+
+
+def read_cache():
+    try:
+        with open(get_cache_file(), 'r') as cache_file:
+            return json.load(cache_file)
+    except (IOError, ValueError):
+        return {}
+
+
+def write_cache(entries):
+    util.write_private_file(get_cache_file(), json.dumps(entries, indent=1))
+
+
+def load(tenant, username):
+    entry = read_cache().get(get_cache_key(tenant, username))
+    if entry is None:
+        return None
+    if entry.get('expires', 0) <= time.time():
+        logging.info("Cached session for " + username + " has expired")
+        remove(tenant, username)
+        return None
+    return AuthSession(entry['endpoint'], entry['username'], entry['session_id'], entry['session_token'], entry['expires'])
+
+
+def save(tenant, username, session):
+    expires = session.expires or time.time() + DEFAULT_SESSION_TTL
+    with _lock:
+        entries = read_cache()
+        now = time.time()
+        entries = dict((key, value) for key, value in entries.items() if value.get('expires', 0) > now)
+        entries[get_cache_key(tenant, username)] = {
+            'endpoint': session.endpoint,
+            'username': session.username,
+            'session_id': session.session_id,
+            'session_token': session.session_token,
+            'expires': expires
+        }
+        write_cache(entries)
+    logging.info("Cached session for " + username + " until " + time.ctime(expires))
+
+
+def remove(tenant, username):
+    with _lock:
+        entries = read_cache()
+        if entries.pop(get_cache_key(tenant, username), None) is not None:
+            write_cache(entries)
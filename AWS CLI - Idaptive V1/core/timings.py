@@ -0,0 +1,228 @@
+# Copyright 2019 CyberArk, LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+
+import json
+import logging
+import platform
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+TRACE_VERSION = 1
+# Spans for single HTTP calls; they roll their bytes, status and request
+# count up into the phase span that is open around them
+HTTP_SPAN = 'http'
+
+
+class Span(object):
+    '''
+    One timed phase of a run. start and end are monotonic seconds
+    '''
+    __slots__ = ('name', 'attrs', 'parent', 'depth', 'thread', 'start', 'end', 'bytes', 'status', 'requests', 'error')
+
+    def __init__(self, name, attrs, parent, start):
+        self.name = name
+        self.attrs = attrs
+        self.parent = parent
+        self.depth = parent.depth + 1 if parent is not None else 0
+        self.thread = threading.current_thread().name
+        self.start = start
+        self.end = None
+        self.bytes = 0
+        self.status = None
+        self.requests = 0
+        self.error = None
+
+    def get_duration(self):
+        if self.end is None:
+            return 0.0
+        return self.end - self.start
+
+    def set_response(self, response, count_body=True):
+        # count_body is off for streamed responses, whose body must be left
+        # for the caller to read
+        content = getattr(response, 'content', None) if count_body else None
+        if content is not None:
+            self.bytes += len(content)
+        self.status = getattr(response, 'status_code', None)
+        self.requests += 1
+
+
+class Recorder(object):
+    '''
+    Collects spans from every thread. Nesting is tracked per thread. Until
+    enabled, spans still time and roll up into their parents but are not kept
+    '''
+    def __init__(self, clock=time.monotonic, enabled=True):
+        self.clock = clock
+        self.enabled = enabled
+        self.origin = clock()
+        self.started = time.time()
+        self.spans = []
+        self.metrics = {}
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def get_stack(self):
+        stack = getattr(self.local, 'stack', None)
+        if stack is None:
+            stack = self.local.stack = []
+        return stack
+
+    def current(self):
+        stack = self.get_stack()
+        return stack[-1] if stack else None
+
+    @contextmanager
+    def span(self, name, **attrs):
+        stack = self.get_stack()
+        span = Span(name, attrs, stack[-1] if stack else None, self.clock())
+        stack.append(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = type(e).__name__
+            raise
+        finally:
+            span.end = self.clock()
+            stack.pop()
+            parent = span.parent
+            if parent is not None:
+                parent.bytes += span.bytes
+                parent.requests += span.requests
+                if span.status is not None:
+                    parent.status = span.status
+            if self.enabled:
+                with self.lock:
+                    self.spans.append(span)
+
+    def enable(self, enabled=True):
+        self.enabled = enabled
+
+    def get_spans(self):
+        with self.lock:
+            return sorted(self.spans, key=lambda span: span.start)
+
+    def get_elapsed(self):
+        return self.clock() - self.origin
+
+    def set_metric(self, name, value):
+        with self.lock:
+            self.metrics[name] = value
+
+    def get_metrics(self):
+        with self.lock:
+            return dict(self.metrics)
+
+    def get_phases(self):
+        phases = []
+        by_name = {}
+        for span in self.get_spans():
+            if span.name == HTTP_SPAN:
+                continue
+            phase = by_name.get(span.name)
+            if phase is None:
+                phase = by_name[span.name] = {'name': span.name, 'depth': span.depth, 'count': 0, 'seconds': 0.0, 'bytes': 0, 'requests': 0, 'status': None, 'errors': 0}
+                phases.append(phase)
+            phase['count'] += 1
+            phase['seconds'] += span.get_duration()
+            phase['bytes'] += span.bytes
+            phase['requests'] += span.requests
+            if span.status is not None:
+                phase['status'] = span.status
+            if span.error is not None:
+                phase['errors'] += 1
+        return phases
+
+    def get_summary(self):
+        lines = ["Phase                              Calls   Time (ms)    Bytes  Status"]
+        main_thread = threading.main_thread().name
+        accounted = sum(span.get_duration() for span in self.get_spans() if span.parent is None and span.thread == main_thread)
+        for phase in self.get_phases():
+            name = '  ' * phase['depth'] + phase['name']
+            status = str(phase['status']) if phase['status'] is not None else '-'
+            if phase['errors']:
+                status = status + ' (' + str(phase['errors']) + ' failed)'
+            lines.append(name.ljust(34) + str(phase['count']).rjust(6) + str(int(phase['seconds'] * 1000)).rjust(12) + str(phase['bytes']).rjust(9) + '  ' + status)
+        elapsed = self.get_elapsed()
+        lines.append('Other (prompts, local work)'.ljust(34) + ''.rjust(6) + str(max(0, int((elapsed - accounted) * 1000))).rjust(12))
+        lines.append('Total'.ljust(34) + ''.rjust(6) + str(int(elapsed * 1000)).rjust(12))
+        for name, value in sorted(self.get_metrics().items()):
+            lines.append(name.ljust(34) + ''.rjust(6) + str(value).rjust(12))
+        return lines
+
+    def to_trace(self):
+        spans = self.get_spans()
+        index = dict((id(span), i) for i, span in enumerate(spans))
+        return {
+            'version': TRACE_VERSION,
+            'started': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(self.started)),
+            'elapsed_ms': round(self.get_elapsed() * 1000, 3),
+            'python': sys.version.split()[0],
+            'platform': platform.system(),
+            'metrics': self.get_metrics(),
+            'spans': [{
+                'id': i,
+                'parent': index.get(id(span.parent)) if span.parent is not None else None,
+                'name': span.name,
+                'thread': span.thread,
+                'start_ms': round((span.start - self.origin) * 1000, 3),
+                'duration_ms': round(span.get_duration() * 1000, 3),
+                'bytes': span.bytes,
+                'status': span.status,
+                'requests': span.requests,
+                'error': span.error,
+                'attrs': span.attrs
+            } for i, span in enumerate(spans)]
+        }
+
+    def export(self, path):
+        with open(path, 'w') as trace_file:
+            json.dump(self.to_trace(), trace_file, indent=1)
+
+
+# Only -timings and -trace read the spans; without them a long running
+# process such as -daemon must not accumulate every span it ever opened
+_recorder = Recorder(enabled=False)
+_show_summary = False
+_trace_file = None
+
+
+def get_recorder():
+    return _recorder
+
+def span(name, **attrs):
+    return _recorder.span(name, **attrs)
+
+def configure(show_summary=False, trace_file=None):
+    global _show_summary, _trace_file
+    _show_summary = show_summary
+    _trace_file = trace_file
+    _recorder.enable(bool(show_summary or trace_file))
+
+def finish():
+    if _show_summary:
+        print()
+        for line in _recorder.get_summary():
+            print(line)
+    if _trace_file:
+        try:
+            _recorder.export(_trace_file)
+            logging.info("Wrote timing trace to %s", _trace_file)
+        except (IOError, OSError) as e:
+            logging.info("Could not write timing trace to %s : %s", _trace_file, e)
+            print("Could not write timing trace to " + _trace_file + " : " + str(e))
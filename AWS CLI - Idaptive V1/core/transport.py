@@ -0,0 +1,179 @@
+# Copyright 2019 CyberArk, LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import threading
+import time
+from http.cookiejar import DefaultCookiePolicy
+from urllib import parse as urlparse
+import requests
+from requests.adapters import HTTPAdapter
+from core import proxyroute
+
+DEFAULT_POOL_SIZE = 4
+DEFAULT_HEADERS = {
+    'x-centrify-native-client': 'true',
+    'User-Agent': 'CyberArkIdentity-AWS-Cli'
+}
+
+
+class CountingAdapter(HTTPAdapter):
+    '''
+    HTTPAdapter which counts how many requests were served on a new connection
+    and how many reused a pooled keep-alive connection
+    '''
+    def __init__(self, stats, **kwargs):
+        self.stats = stats
+        super().__init__(**kwargs)
+
+    def _get_pool(self, request, verify, proxies, cert):
+        if hasattr(self, 'get_connection_with_tls_context'):
+            return self.get_connection_with_tls_context(request, verify, proxies=proxies, cert=cert)
+        return self.get_connection(request.url, proxies)
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        try:
+            pool = self._get_pool(request, verify, proxies, cert)
+            before = pool.num_connections
+        except Exception:
+            pool = None
+        response = super().send(request, stream=stream, timeout=timeout, verify=verify, cert=cert, proxies=proxies)
+        self.stats['requests'] += 1
+        if (pool is not None and pool.num_connections > before):
+            self.stats['connections'] += pool.num_connections - before
+        elif (pool is not None):
+            self.stats['reused'] += 1
+        return response
+
+
+class Transport(object):
+    '''
+    Shared HTTP transport. Keeps one keep-alive requests.Session per endpoint
+    (scheme://host:port) so repeated REST calls reuse the TCP/TLS connection
+    '''
+    def __init__(self, pool_size=DEFAULT_POOL_SIZE, keep_alive=True, headers=None, keep_cookies=False):
+        self.pool_size = pool_size
+        self.keep_alive = keep_alive
+        self.headers = dict(DEFAULT_HEADERS)
+        if headers:
+            self.headers.update(headers)
+        self.keep_cookies = keep_cookies
+        self.sessions = {}
+        self.stats = {}
+        self.first_use = {}
+        self.lock = threading.Lock()
+
+    def get_endpoint_key(self, url):
+        parsed_url = urlparse.urlsplit(url)
+        return parsed_url.scheme + "://" + parsed_url.netloc.lower()
+
+    def new_session(self, key):
+        session = requests.Session()
+        session.headers.update(self.headers)
+        if not self.keep_alive:
+            session.headers['Connection'] = 'close'
+        if not self.keep_cookies:
+            # Every call carries its own Authorization header; do not let the
+            # pooled session replay cookies from earlier responses.
+            session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        stats = {'requests': 0, 'connections': 0, 'reused': 0, 'route': 'direct', 'seconds': 0.0}
+        adapter = CountingAdapter(stats, pool_connections=self.pool_size, pool_maxsize=self.pool_size)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        self.stats[key] = stats
+        return session
+
+    def get_session(self, url):
+        key = self.get_endpoint_key(url)
+        with self.lock:
+            session = self.sessions.get(key)
+            if session is None:
+                logging.info("Opening pooled session for " + key)
+                session = self.new_session(key)
+                self.sessions[key] = session
+        return session
+
+    def send(self, method, url, **kwargs):
+        # proxies may be a ProxyRouter; it is resolved per endpoint here so
+        # each route keeps its own pooled (and, behind a proxy, tunnelled)
+        # connections
+        kwargs['proxies'] = proxyroute.get_proxies(kwargs.get('proxies'), url)
+        route = proxyroute.hide_credentials((kwargs['proxies'] or {}).get(urlparse.urlsplit(url).scheme))
+        key = self.get_endpoint_key(url)
+        start = time.monotonic()
+        try:
+            return self.get_session(url).request(method, url, **kwargs)
+        finally:
+            elapsed = time.monotonic() - start
+            with self.lock:
+                stats = self.stats.get(key)
+                if stats is not None:
+                    stats['route'] = route
+                    stats['seconds'] += elapsed
+            logging.info("%s %s via %s took %d ms", method, key, route, elapsed * 1000)
+
+    def request(self, method, url, **kwargs):
+        self.first_use.setdefault(self.get_endpoint_key(url), time.monotonic())
+        return self.send(method, url, **kwargs)
+
+    def warm(self, url, **kwargs):
+        # Opens (or re-validates) a pooled connection without counting as the
+        # endpoint's first real use
+        kwargs.setdefault('allow_redirects', False)
+        return self.send('HEAD', url, **kwargs)
+
+    def get_first_use(self):
+        return dict(self.first_use)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def get_stats(self):
+        with self.lock:
+            return dict((key, dict(value)) for key, value in self.stats.items())
+
+    def log_stats(self):
+        for key, value in self.get_stats().items():
+            average = value['seconds'] * 1000 / value['requests'] if value['requests'] else 0
+            logging.info("Transport " + key + " via " + value['route'] + " requests : " + str(value['requests']) + " new connections : " + str(value['connections']) + " reused : " + str(value['reused']) + " average : " + str(int(average)) + " ms")
+
+    def close(self):
+        with self.lock:
+            for session in self.sessions.values():
+                session.close()
+            self.sessions.clear()
+
+
+_transport = None
+_transport_lock = threading.Lock()
+
+
+def configure(pool_size=DEFAULT_POOL_SIZE, keep_alive=True, headers=None, keep_cookies=False):
+    global _transport
+    with _transport_lock:
+        if _transport is not None:
+            _transport.close()
+        _transport = Transport(pool_size, keep_alive, headers, keep_cookies)
+    return _transport
+
+
+def get_transport():
+    global _transport
+    with _transport_lock:
+        if _transport is None:
+            _transport = Transport()
+        return _transport
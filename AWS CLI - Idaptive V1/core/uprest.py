@@ -12,18 +12,125 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import codecs
 import json
-from core import restclient
+import re
+from core import restclient, timings
 import logging
-def get_applications(user, session, environment, proxy):
-    method = "/uprest/getupdata"
-    body = {}
+
+CHUNK_SIZE = 16 * 1024
+# The start of Result.Apps; a quote escaped inside a string value cannot
+# begin it
+APPS_START = re.compile(r'(?<!\\)"Apps"\s*:\s*\[')
+SEPARATORS = re.compile(r'[\s,]*')
+SEEKING, IN_APPS, DONE = range(3)
+
+
+class AppListParser(object):
+    '''
+    Incremental parser for the getupdata document. Decodes the apps of
+    Result.Apps one at a time with the JSON scanner as the bytes arrive, hands each
+    to keep and drops it; the rest of the document is skipped
+    '''
+    def __init__(self, keep):
+        self.keep = keep
+        # The decoder's C scanner, without raw_decode's per-call wrapper
+        self.scan = json.JSONDecoder().scan_once
+        self.text_decoder = codecs.getincrementaldecoder('utf-8')()
+        self.buffer = ''
+        self.state = SEEKING
+        self.apps = []
+        self.seen = 0
+        # Longest the undecoded text buffer got, in characters. This is a
+        # buffer length, not memory use; bench_getupdata measures that
+        self.peak_buffer = 0
+
+    def feed(self, data):
+        if (self.state == DONE):
+            return
+        self.buffer += self.text_decoder.decode(data)
+        self.peak_buffer = max(self.peak_buffer, len(self.buffer))
+        self.parse()
+
+    def parse(self):
+        if (self.state == SEEKING):
+            match = APPS_START.search(self.buffer)
+            if match is None:
+                return
+            self.buffer = self.buffer[match.end():]
+            self.state = IN_APPS
+        position = 0
+        buffer = self.buffer
+        length = len(buffer)
+        skip = SEPARATORS.match
+        scan = self.scan
+        keep = self.keep
+        apps = self.apps
+        seen = 0
+        while True:
+            position = skip(buffer, position).end()
+            if (position == length):
+                break
+            if (buffer[position] == ']'):
+                self.state = DONE
+                position = length
+                break
+            try:
+                app, position_after = scan(buffer, position)
+            except (ValueError, StopIteration):
+                # The app is cut off at the end of this chunk
+                break
+            seen += 1
+            kept = keep(app)
+            if kept is not None:
+                apps.append(kept)
+            position = position_after
+        self.seen += seen
+        self.buffer = buffer[position:]
+
+    def close(self):
+        self.buffer += self.text_decoder.decode(b'', final=True)
+        if (self.state == IN_APPS):
+            raise ValueError("getupdata response ended inside the app list")
+        if (self.state == SEEKING):
+            # No app list, e.g. an error document; read it the old way
+            document = json.loads(self.buffer)
+            self.buffer = ''
+            for app in document["Result"]["Apps"]:
+                self.seen += 1
+                kept = self.keep(app)
+                if kept is not None:
+                    self.apps.append(kept)
+        self.buffer = ''
+        return self.apps
+
+
+def get_headers(session):
     headers = {}
     headers['X-CENTRIFY-NATIVE-CLIENT'] = 'true'
     headers['Content-type'] = 'application/json'
     session_token = "Bearer "+session.session_token
     headers['Authorization'] = session_token
-    response = restclient.call_rest_post(session.endpoint, method, body, headers, environment.get_certpath(), proxy,environment.get_debug())
-    logging.info(response.text)
-    return response.json()
+    return headers
 
+def stream_applications(user, session, environment, proxy, keep):
+    # Streams getupdata compressed and parses it as it arrives; only the apps
+    # keep returns something for are held in memory
+    method = "/uprest/getupdata"
+    headers = get_headers(session)
+    headers['Accept-Encoding'] = 'gzip, deflate'
+    parser = AppListParser(keep)
+    with timings.span('getupdata') as span:
+        response = restclient.call_rest_post(session.endpoint, method, {}, headers, environment.get_certpath(), proxy, environment.get_debug(), stream=True)
+        try:
+            for chunk in response.iter_content(CHUNK_SIZE):
+                parser.feed(chunk)
+        except BaseException:
+            response.close()
+            raise
+        wire_bytes = response.raw.tell()
+        span.bytes += wire_bytes
+        apps = parser.close()
+    logging.info("getupdata : %d apps, %d kept, %d bytes transferred (%s), longest text buffer %d characters",
+                 parser.seen, len(apps), wire_bytes, response.headers.get('Content-Encoding', 'identity'), parser.peak_buffer)
+    return apps
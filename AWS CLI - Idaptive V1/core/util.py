@@ -12,6 +12,12 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import os
+import time
+from os.path import expanduser
+
+CACHE_DIR_ENV = 'IDAPTIVE_AWS_CLI_CACHE'
+
 def printline(n=80):
     print('-' * n)
     
@@ -19,6 +25,46 @@ def printobj(obj):
     printline()
     print(obj)
     printline()
-    
 
-    
+def get_cache_dir():
+    cache_dir = os.environ.get(CACHE_DIR_ENV) or os.path.join(expanduser("~"), ".idaptive-aws-cli")
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir, 0o700)
+    return cache_dir
+
+def write_private_file(path, content):
+    import tempfile
+    directory = os.path.dirname(path)
+    handle, temp_path = tempfile.mkstemp(prefix='.tmp.', dir=directory)
+    try:
+        with os.fdopen(handle, 'w') as temp_file:
+            temp_file.write(content)
+        os.chmod(temp_path, 0o600)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+def parse_iso_time(value):
+    from datetime import datetime, timezone
+    value = value.strip().replace('Z', '+00:00')
+    if '.' in value:
+        head, tail = value.split('.', 1)
+        fraction = tail
+        zone = ''
+        for sep in ('+', '-'):
+            if sep in tail:
+                fraction, zone = tail.split(sep, 1)
+                zone = sep + zone
+                break
+        value = head + '.' + fraction[:6].ljust(6, '0') + zone
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+def format_epoch(epoch):
+    if epoch is None:
+        return None
+    return time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(epoch))
@@ -0,0 +1,163 @@
+# Copyright 2019 CyberArk, LLC.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+
+# Opens pooled keep-alive connections to the endpoints a login is about to
+# use (tenant, cached pod, STS) on background threads while the user is busy
+# with a prompt, so the first real request finds the TCP/TLS (and proxy
+# CONNECT) work already done. This module is imported before the username
+# prompt and must not pull in requests itself; the worker thread does.
+
+import logging
+import threading
+import time
+
+WARM_TIMEOUT = 5
+# A connection idle for longer than this may have been closed by the server
+# or a proxy; the next prompt opens it again
+REWARM_AFTER = 45
+
+
+class Target(object):
+    '''
+    One endpoint being warmed
+    '''
+    def __init__(self, url):
+        self.url = url
+        self.started = None
+        self.finished = None
+        self.status = None
+        self.error = None
+        self.thread = None
+
+    def is_busy(self):
+        return self.thread is not None and self.thread.is_alive()
+
+
+class Warmer(object):
+    '''
+    Configures the shared transport and warms a set of endpoints in the background
+    '''
+    def __init__(self, pool_size, keep_alive, proxy=None, certpath=True):
+        self.pool_size = pool_size
+        self.keep_alive = keep_alive
+        self.proxy = proxy or {}
+        self.certpath = certpath
+        self.targets = {}
+        self.lock = threading.Lock()
+        self.ready = threading.Event()
+
+    def start(self, get_urls):
+        # get_urls runs on the worker thread as working out some endpoints
+        # (STS) needs modules that import requests
+        thread = threading.Thread(target=self.prepare, args=(get_urls,), name='warmup', daemon=True)
+        thread.start()
+        return self
+
+    def prepare(self, get_urls):
+        try:
+            from core import transport
+            transport.configure(pool_size=self.pool_size, keep_alive=self.keep_alive)
+        finally:
+            self.ready.set()
+        try:
+            self.add(get_urls())
+        except Exception as e:
+            logging.info("Could not work out the endpoints to warm : %s", e)
+
+    def wait_ready(self):
+        self.ready.wait()
+
+    def add(self, urls):
+        from core import transport
+        for url in urls:
+            if url:
+                # One connection per endpoint, whatever the path
+                key = transport.get_transport().get_endpoint_key(url)
+                with self.lock:
+                    self.targets.setdefault(key, Target(url))
+        self.kick()
+
+    def kick(self):
+        if not self.ready.is_set():
+            return
+        now = time.monotonic()
+        with self.lock:
+            for target in self.targets.values():
+                if target.is_busy():
+                    continue
+                if target.finished is not None and now - target.finished < REWARM_AFTER:
+                    continue
+                target.thread = threading.Thread(target=self.warm, args=(target,), name='warmup', daemon=True)
+                target.thread.start()
+
+    def warm(self, target):
+        from core import timings, transport
+        target.started = time.monotonic()
+        target.finished = None
+        try:
+            with timings.span('warmup', url=target.url) as span:
+                response = transport.get_transport().warm(target.url, proxies=self.proxy, verify=self.certpath, timeout=WARM_TIMEOUT)
+                span.status = response.status_code
+            target.status = response.status_code
+        except Exception as e:
+            target.error = str(e)
+            logging.info("Warming %s failed : %s", target.url, e)
+        target.finished = time.monotonic()
+
+    def get_round_trips(self):
+        # Total duration of the warm-up HEAD round trips (connection set-up
+        # plus one request) that finished before the first real request to
+        # their endpoint; later ones saved nothing. Connection set-up is not
+        # timed on its own, so this is an upper bound on the time saved
+        from core import transport
+        first_use = transport.get_transport().get_first_use()
+        elapsed = 0.0
+        used = 0
+        with self.lock:
+            targets = list(self.targets.items())
+        for key, target in targets:
+            if target.error is not None or target.finished is None:
+                continue
+            used_at = first_use.get(key)
+            if used_at is not None and target.finished <= used_at:
+                elapsed += target.finished - target.started
+                used += 1
+        return elapsed, used
+
+    def report(self):
+        from core import timings
+        elapsed, used = self.get_round_trips()
+        timings.get_recorder().set_metric('warmup_round_trip_ms', round(elapsed * 1000, 3))
+        timings.get_recorder().set_metric('warmup_connections_used', used)
+        logging.info("Warm-up finished %d ms of HEAD round trips (connection set-up and one request) before first use of %d endpoint(s)", int(elapsed * 1000), used)
+
+
+_warmer = None
+
+
+def start(get_urls, pool_size, keep_alive, proxy=None, certpath=True):
+    global _warmer
+    _warmer = Warmer(pool_size, keep_alive, proxy, certpath).start(get_urls)
+    return _warmer
+
+def refresh():
+    # Called before each prompt
+    if _warmer is not None:
+        _warmer.kick()
+
+def report():
+    if _warmer is not None and _warmer.ready.is_set():
+        _warmer.report()